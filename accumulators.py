@@ -0,0 +1,149 @@
+"""
+Running statistics of grid fields for result analysis
+
+Each accumulator keeps its result as a grid field (at node or link) and
+updates it in place with numpy ufuncs (out= buffers), so no new full grid
+array is created at each update. An update can be limited to an index (e.g.
+the active nodes of the numba overland flow engine) when the data of the
+other nodes did not change or is zero.
+
+Usage:
+from accumulators import MaxAccumulator
+max_depth = MaxAccumulator(grid, 'max_surface_water__depth')
+max_depth.update(grid.at_node['surface_water__depth'], elapsed_time, dt)
+
+"""
+
+import numpy as np
+
+
+class Accumulator:
+    """base class of running statistics stored as a grid field"""
+
+    full_update = False  # update needs the data of all nodes (or links)
+
+    def __init__(self, grid, name, at='node', dtype=float):
+        self.grid = grid
+        self.name = name
+        self.at = at
+
+        if name not in grid[at]:
+            grid.add_zeros(name, at=at, dtype=dtype)
+
+    @property
+    def values(self):
+        """result of the statistic"""
+        return self.grid[self.at][self.name]
+
+    def _buffer(self):
+        """empty array with the same size as the result field"""
+        return np.empty_like(self.values)
+
+    def update(self, data, elapsed_time, dt, index=None):
+        """
+        update the statistic with data at elapsed_time (s), where dt (s) is the
+        time step since the last update. If index is given, data are the
+        values at index and only these values are updated.
+        """
+        raise NotImplementedError
+
+    def get_state(self):
+        """get the internal arrays (besides the result field) for checkpoints"""
+        return {}
+
+    def set_state(self, state):
+        """restore the internal arrays from get_state()"""
+        pass
+
+
+class MaxAccumulator(Accumulator):
+    """maximum value"""
+
+    def update(self, data, elapsed_time, dt, index=None):
+        if index is None:
+            np.maximum(self.values, data, out=self.values)
+        else:
+            self.values[index] = np.maximum(self.values[index], data)
+
+
+class PeakTimeAccumulator(Accumulator):
+    """time (s) when the maximum value happens"""
+
+    def __init__(self, grid, name, at='node'):
+        super().__init__(grid, name, at=at)
+        self.max_values = np.zeros_like(self.values)
+        self._mask = np.zeros(self.values.shape, dtype=bool)
+
+    def update(self, data, elapsed_time, dt, index=None):
+        if index is None:
+            np.greater(data, self.max_values, out=self._mask)
+            np.copyto(self.values, elapsed_time, where=self._mask)
+            np.maximum(self.max_values, data, out=self.max_values)
+        else:
+            max_values = self.max_values[index]
+            self.values[index[data > max_values]] = elapsed_time
+            self.max_values[index] = np.maximum(max_values, data)
+
+    def get_state(self):
+        return {'max_values': self.max_values}
+
+    def set_state(self, state):
+        self.max_values[:] = state['max_values']
+
+
+class CumulativeAccumulator(Accumulator):
+    """time integral of the absolute value (e.g. discharge to volume)"""
+
+    def __init__(self, grid, name, at='node', scale=1.0):
+        super().__init__(grid, name, at=at)
+        self.scale = scale
+        self._step = self._buffer()
+
+    def update(self, data, elapsed_time, dt, index=None):
+        if index is None:
+            np.absolute(data, out=self._step)
+            np.multiply(self._step, dt * self.scale, out=self._step)
+            np.add(self.values, self._step, out=self.values)
+        else:
+            self.values[index] += np.absolute(data) * (dt * self.scale)
+
+
+class DurationAccumulator(Accumulator):
+    """total time (s) when the value is above a threshold"""
+
+    def __init__(self, grid, name, at='node', threshold=0.0):
+        super().__init__(grid, name, at=at)
+        self.threshold = threshold
+        self._mask = np.zeros(self.values.shape, dtype=bool)
+
+    def update(self, data, elapsed_time, dt, index=None):
+        if index is None:
+            np.greater(data, self.threshold, out=self._mask)
+            np.add(self.values, dt, out=self.values, where=self._mask)
+        else:
+            self.values[index[data > self.threshold]] += dt
+
+
+class MeanAccumulator(Accumulator):
+    """time weighted mean value (all values are updated, the index is not used)"""
+
+    full_update = True
+
+    def __init__(self, grid, name, at='node'):
+        super().__init__(grid, name, at=at)
+        self.total = np.zeros_like(self.values)
+        self.total_time = 0.0
+        self._step = self._buffer()
+
+    def update(self, data, elapsed_time, dt, index=None):
+        np.multiply(data, dt, out=self._step)
+        np.add(self.total, self._step, out=self.total)
+        self.total_time += dt
+        np.divide(self.total, self.total_time, out=self.values)
+
+    def get_state(self):
+        return {'total': self.total, 'total_time': np.array(self.total_time)}
+
+    def set_state(self, state):
+        self.total[:] = state['total']
+        self.total_time = float(state['total_time'])
@@ -0,0 +1,58 @@
+"""
+Benchmark for getting the outlet discharge in FloodSimulator.run()
+
+compares the full grid OverlandFlow.discharge_mapper() with the outlet only
+discharge calculation and times a short geer_canyon run with different
+max_discharge_interval values.
+
+Usage (from the repo root):
+$ python benchmarks/outlet_discharge_benchmark.py
+"""
+
+import os
+import sys
+import timeit
+import tempfile
+
+import numpy as np
+from landlab.components import OverlandFlow
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flood_simulator import FloodSimulator
+from gauges import GaugeSet
+
+config_file = 'landscape_use_case/config_file.toml'
+repeat = 1000
+
+# discharge at one step ######################
+fs = FloodSimulator.from_file(config_file)
+overland_flow = OverlandFlow(fs.model_grid, steep_slopes=True)
+q = fs.model_grid.at_link['surface_water__discharge']
+q[:] = np.random.default_rng(123).normal(size=q.size)
+
+outlet_gauge = GaugeSet(fs.model_grid, node_ids=[fs.outlet_id])
+
+full_grid = overland_flow.discharge_mapper(q, convert_to_volume=True)[fs.outlet_id]
+outlet_only = outlet_gauge.get_discharge(q)[0]
+assert full_grid == outlet_only
+
+t_full = timeit.timeit(
+    lambda: overland_flow.discharge_mapper(q, convert_to_volume=True)[fs.outlet_id],
+    number=repeat) / repeat
+t_outlet = timeit.timeit(
+    lambda: outlet_gauge.get_discharge(q),
+    number=repeat) / repeat
+
+print(f'grid shape: {fs.model_grid.shape}')
+print(f'discharge_mapper: {t_full * 1e6:.1f} us/step')
+print(f'outlet only: {t_outlet * 1e6:.1f} us/step ({t_full / t_outlet:.0f}x)')
+
+# short model run ############################
+for interval in [1, 10, 0]:
+    with tempfile.TemporaryDirectory() as output_folder:
+        fs = FloodSimulator.from_file(config_file)
+        fs.output.update(output_folder=output_folder, plot_olf=False, plot_inf=False,
+                         max_discharge_interval=interval)
+        fs.model_run['model_run_time'] = 60
+        t_run = timeit.timeit(fs.run, number=1)
+    print(f'run 60 min (max_discharge_interval={interval}): {t_run:.2f} s')
@@ -0,0 +1,94 @@
+"""
+Hydrograph error of the float32 precision mode on the use cases of the repo
+
+runs the shortened use cases of use_case_benchmark.py with
+model_run.precision = 'float64' and 'float32' (numba overland flow engine)
+and compares the outlet hydrographs. The error of float32 is given relative
+to the float64 peak discharge:
+
+- peak_error: error of the peak discharge
+- max_error: max error of the discharge records (same record times)
+- volume_error: error of the discharge volume
+
+The memory of the grid fields (MB) shows the saving of float32 (the
+elevation and the fields of sums stay float64).
+
+Usage (from the repo root):
+$ python benchmarks/precision_benchmark.py
+$ python benchmarks/precision_benchmark.py --cases landscape paper
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from use_case_benchmark import repo_folder, use_cases, get_case_config
+
+
+def run_use_case(use_case, precision):
+    """run a use case, returns the outlet hydrograph and the memory (MB) of the grid fields"""
+    os.chdir(repo_folder)
+    sys.path.insert(0, repo_folder)
+    from flood_simulator import FloodSimulator
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        # the benchmark case of the same name has the use case settings
+        config = get_case_config(use_case, output_folder)
+        config['output']['profile'] = False
+        config['model_run']['precision'] = precision
+        config['olf_info']['engine'] = 'numba'
+
+        fs = FloodSimulator(**config)
+        fs.run()
+        hydrograph = pd.read_csv(os.path.join(output_folder, 'outlet_discharge.csv'),
+                                 index_col=0)
+
+    field_bytes = sum(fs.model_grid[at][name].nbytes
+                      for at in ['node', 'link'] for name in fs.model_grid[at])
+
+    return hydrograph, field_bytes / 1024 ** 2
+
+
+def compare_precision(use_case):
+    """compare the float32 hydrograph with the float64 hydrograph of a use case"""
+    results = {}
+    for precision in ['float64', 'float32']:
+        results[precision] = run_use_case(use_case, precision)
+
+    (reference, reference_bytes), (hydrograph, field_bytes) = \
+        results['float64'], results['float32']
+    time = reference['time'].to_numpy()
+    discharge = reference['discharge'].to_numpy()
+    # records of float32 at the float64 record times (sub-steps can differ)
+    values = np.interp(time, hydrograph['time'], hydrograph['discharge'])
+    peak = discharge.max()
+
+    return {
+        'use_case': use_case,
+        'records': len(reference),
+        'peak_discharge': peak,
+        'peak_error': abs(hydrograph['discharge'].max() - peak) / peak,
+        'max_error': np.abs(values - discharge).max() / peak,
+        'volume_error': abs(np.trapz(values, time) - np.trapz(discharge, time))
+        / np.trapz(discharge, time),
+        'field_mb_float64': reference_bytes,
+        'field_mb_float32': field_bytes,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Hydrograph error of float32 runs')
+    parser.add_argument('--cases', nargs='+', default=list(use_cases),
+                        choices=list(use_cases))
+    parser.add_argument('--output', default=os.path.join(repo_folder, 'benchmarks',
+                                                         'precision_benchmark.csv'))
+    args = parser.parse_args()
+
+    summary = pd.DataFrame([compare_precision(use_case) for use_case in args.cases])
+    summary.to_csv(args.output, index=False)
+    print(summary.to_string(index=False, float_format='{:.3g}'.format))
@@ -0,0 +1,176 @@
+"""
+Benchmark of FloodSimulator on the use cases of the repo
+
+times the setup and the model run of shortened runs of simple_use_case,
+landscape_use_case, betasso_example and paper_use_case (flat domain) with
+infiltration on/off, uniform or raster rain, plotting on/off and the landlab
+or numba overland flow engine (one or 4 tiles, float64 or float32). Each case
+runs in a new process to get its peak memory (RSS), and the number of model
+sub-steps per second is taken from the phase timer of the model run.
+
+The results are printed as a table and saved as a csv file (default
+benchmarks/use_case_benchmark.csv), so the results of two commits can be
+compared.
+
+Usage (from the repo root):
+$ python benchmarks/use_case_benchmark.py
+$ python benchmarks/use_case_benchmark.py --cases landscape landscape_inf --repeat 3
+$ python benchmarks/use_case_benchmark.py --output results_before.csv
+"""
+
+import os
+import sys
+import json
+import copy
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+import pandas as pd
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# use case configuration and the settings changed for the benchmark
+use_cases = {
+    'simple': ('simple_use_case/config_file.toml', {
+        'model_run.model_run_time': 20,
+    }),
+    'landscape': ('landscape_use_case/config_file.toml', {
+        'model_run.model_run_time': 20,
+    }),
+    # config_file2.toml has the settings of the old model version
+    'betasso': ('landscape_use_case/config_file.toml', {
+        'terrain.grid_file': 'betasso_example/betasso30m.txt',
+        'terrain.outlet_id': 76,
+        'olf_info.rain_intensity': 100,
+        'olf_info.steep_slopes': True,
+        'olf_info.alpha': 0.7,
+        'model_run.storm_duration': 10,
+        'model_run.time_step': 1,
+        'model_run.model_run_time': 20,
+    }),
+    'paper': ('landscape_use_case/config_file.toml', {
+        'terrain.grid_file': 'paper_use_case/flat_domain.asc',
+        'terrain.outlet_id': 3840,  # middle of the left edge
+        'model_run.model_run_time': 20,
+    }),
+}
+
+# benchmark cases: (use case, settings added to the use case settings)
+cases = {
+    'simple': ('simple', {}),
+    'landscape': ('landscape', {}),
+    'landscape_inf': ('landscape', {'model_run.activate_inf': True}),
+    'landscape_numba': ('landscape', {'olf_info.engine': 'numba'}),
+    'landscape_numba_tiles': ('landscape', {'olf_info.engine': 'numba',
+                                            'olf_info.n_tiles': 4}),
+    'landscape_numba_float32': ('landscape', {'olf_info.engine': 'numba',
+                                              'model_run.precision': 'float32'}),
+    'landscape_rain_file': ('landscape', {'olf_info.rain_file': 'rain_input_large.tif'}),
+    'landscape_plot': ('landscape', {'output.plot_olf': True,
+                                     'model_run.model_run_time': 10}),
+    'betasso': ('betasso', {}),
+    'betasso_inf': ('betasso', {'model_run.activate_inf': True}),
+    'paper': ('paper', {}),
+}
+
+
+def get_case_config(name, output_folder):
+    """get the configuration of a benchmark case"""
+    use_case, case_settings = cases[name]
+    config_file, settings = use_cases[use_case]
+
+    with open(os.path.join(repo_folder, config_file), mode='rb') as fp:
+        config = tomllib.load(fp)
+
+    # plots are off unless the case turns them on
+    settings = {'output.plot_olf': False, 'output.plot_inf': False,
+                **settings, **case_settings}
+    config = copy.deepcopy(config)
+    for key, value in settings.items():
+        section, key = key.split('.', 1)
+        config[section][key] = value
+
+    config['output']['output_folder'] = output_folder
+    config['output']['profile'] = True
+
+    return config
+
+
+def run_case(name):
+    """run a benchmark case in this process and get the results"""
+    os.chdir(repo_folder)
+    sys.path.insert(0, repo_folder)
+    from flood_simulator import FloodSimulator
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        config = get_case_config(name, output_folder)
+
+        start = time.perf_counter()
+        fs = FloodSimulator(**config)
+        setup_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fs.run()
+        run_time = time.perf_counter() - start
+
+    report = fs.timer.get_report()
+
+    return {
+        'case': name,
+        'grid_shape': 'x'.join(str(n) for n in fs.model_grid.shape),
+        'setup_time': setup_time,
+        'run_time': run_time,
+        'steps': report['steps'],
+        'steps_per_second': report['steps_per_second'],
+        'overland_flow_time': report['phases']['overland_flow']['time'],
+        # ru_maxrss is kB on linux and bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / (1024 ** 2 if sys.platform == 'darwin' else 1024),
+    }
+
+
+def run_benchmark(names, repeat=1):
+    """run each case in a new process and get the results (best of repeat)"""
+    results = []
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            process = subprocess.run(
+                [sys.executable, '-W', 'ignore', os.path.abspath(__file__),
+                 '--run-case', name],
+                capture_output=True, text=True)
+            if process.returncode != 0:
+                print(f'{name} failed:\n{process.stderr[-2000:]}', file=sys.stderr)
+                break
+            runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+
+        if runs:
+            results.append(min(runs, key=lambda result: result['run_time']))
+            print(f"{name}: {results[-1]['run_time']:.2f} s", file=sys.stderr)
+
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the use cases')
+    parser.add_argument('--cases', nargs='+', default=list(cases), choices=list(cases))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', default=os.path.join(repo_folder, 'benchmarks',
+                                                         'use_case_benchmark.csv'))
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        # the tqdm progress bar goes to stderr, the result is the last stdout line
+        print(json.dumps(run_case(args.run_case)))
+    else:
+        summary = run_benchmark(args.cases, args.repeat)
+        summary.to_csv(args.output, index=False)
+        print(summary.to_string(index=False, float_format='{:.3f}'.format))
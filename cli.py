@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+
+"""
+Command-line interface of the Flood Simulator
+
+Description:
+This code runs the tools of the repo as subcommands. Each subcommand imports
+only the modules it needs, so Landlab (and the numerical and plotting
+packages it loads) is not imported to validate a configuration file or to
+analyze hydrographs, and the imports of a batch of model runs are done once.
+
+- run: model runs of configuration files (or a checkpoint with --resume)
+- validate: check configuration files (sections, keys, options and input
+  files) without reading the terrain
+- ensemble: ensemble runs of an ensemble configuration file
+- analyze: hydrograph analysis of run folders (see hydrograph_analysis.py)
+- bench: run a benchmark script of the benchmarks folder
+
+Usage:
+$ python cli.py run config_file.toml
+$ python cli.py run run1.toml run2.toml run3.toml
+$ python cli.py run --resume output/checkpoint.npz
+$ python cli.py validate config_file.toml simple_use_case/config_file.toml
+$ python cli.py ensemble ensemble_config.toml
+$ python cli.py analyze output --interval 60 --summary summary.csv
+$ python cli.py bench use_case --cases landscape
+
+"""
+
+import os
+import sys
+import argparse
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+from options import (ENGINES, PRECISIONS, RAIN_INTERPOLATIONS, HYETOGRAPHS,
+                     FLOOD_METRICS, RESAMPLE_METHODS)
+
+repo_folder = os.path.dirname(os.path.abspath(__file__))
+
+# keys read without a default by FloodSimulator (infiltration keys only if
+# model_run.activate_inf is true)
+REQUIRED_KEYS = {
+    'terrain': ['grid_file', 'outlet_id', 'nodata_value'],
+    'output': ['output_folder', 'plot_olf', 'plot_inf'],
+    'model_run': ['model_run_time', 'storm_duration', 'time_step', 'activate_inf'],
+    'infil_info': ['conductivity_file', 'hydraulic_conductivity', 'soil_water_file',
+                   'soil_water_infiltration_depth'],
+    'olf_info': ['rain_intensity', 'rain_file', 'surface_water_file',
+                 'surface_water_depth', 'steep_slopes', 'alpha', 'mannings_n', 'g',
+                 'theta'],
+}
+INFILTRATION_KEYS = ['soil_bulk_density', 'initial_soil_moisture_content',
+                     'soil_type', 'volume_fraction_coarse_fragments',
+                     'coarse_sed_flag', 'surface_water_minimum_depth',
+                     'soil_pore_size_distribution_index', 'soil_bubbling_pressure',
+                     'wetting_front_capillary_pressure_head']
+
+# supported options (the first one is the default)
+OPTIONS = {
+    ('olf_info', 'engine'): ENGINES,
+    ('model_run', 'precision'): PRECISIONS,
+    ('olf_info', 'rain_interpolation'): RAIN_INTERPOLATIONS,
+}
+
+# input files (a path or '' for no file)
+INPUT_FILES = [('terrain', 'grid_file'), ('olf_info', 'rain_file'),
+               ('olf_info', 'surface_water_file'), ('infil_info', 'conductivity_file'),
+               ('infil_info', 'soil_water_file')]
+
+BENCHMARKS = ['use_case', 'outlet_discharge', 'precision']
+
+
+def validate_config(config):
+    """get the errors of the settings of a configuration (empty if valid)"""
+    errors = []
+    for section, keys in REQUIRED_KEYS.items():
+        if section not in config:
+            errors.append(f'Missing section [{section}]')
+            continue
+        errors += [f'Missing key {section}.{key}' for key in keys
+                   if key not in config[section]]
+    if errors:
+        return errors
+
+    if config['model_run']['activate_inf']:
+        errors += [f'Missing key infil_info.{key} (activate_inf = true)'
+                   for key in INFILTRATION_KEYS if key not in config['infil_info']]
+
+    for (section, key), options in OPTIONS.items():
+        value = config[section].get(key, options[0])
+        if value not in options:
+            errors.append(f'Unsupported {section}.{key}: {value!r} ({", ".join(options)})')
+
+    hyetograph = config['olf_info'].get('hyetograph')
+    if isinstance(hyetograph, str) and hyetograph and hyetograph not in HYETOGRAPHS:
+        errors.append(f'Unsupported olf_info.hyetograph: {hyetograph!r}')
+
+    for metric in config['output'].get('flood_metrics', []):
+        if metric not in FLOOD_METRICS:
+            errors.append(f'Unsupported flood metric: {metric!r}')
+
+    if 'inundation_duration' in config['output'].get('flood_metrics', []) and \
+            config['output'].get('inundation_depth', 0.01) < \
+            config['olf_info'].get('wet_depth', 0):
+        errors.append('output.inundation_depth must be at least olf_info.wet_depth')
+
+    for key in ['model_run_time', 'time_step']:
+        if not config['model_run'][key] > 0:
+            errors.append(f'model_run.{key} must be positive')
+
+    # settings of the numba engine
+    olf_info = config['olf_info']
+    if olf_info.get('engine', 'landlab') != 'numba':
+        if olf_info.get('wet_depth', 0) > 0:
+            errors.append("olf_info.wet_depth > 0 needs olf_info.engine = 'numba'")
+        if olf_info.get('n_tiles', 1) > 1:
+            errors.append("olf_info.n_tiles > 1 needs olf_info.engine = 'numba'")
+        if config['model_run'].get('precision', 'float64') != 'float64':
+            errors.append("model_run.precision = 'float32' needs "
+                          "olf_info.engine = 'numba'")
+
+    for section, key in INPUT_FILES:
+        paths = config[section].get(key, '')
+        for path in [paths] if isinstance(paths, str) else paths:
+            if path and not os.path.isfile(path):
+                errors.append(f'File of {section}.{key} not found: {path}')
+
+    return errors
+
+
+def run_command(args):
+    from flood_simulator import FloodSimulator
+
+    if args.resume:
+        FloodSimulator.from_checkpoint(args.resume).run()
+    for config_file in args.config_files:
+        FloodSimulator.from_file(config_file).run()
+
+
+def validate_command(args):
+    n_invalid = 0
+    for config_file in args.config_files:
+        try:
+            with open(config_file, mode='rb') as fp:
+                errors = validate_config(tomllib.load(fp))
+        except (OSError, tomllib.TOMLDecodeError) as error:
+            errors = [str(error)]
+
+        if errors:
+            n_invalid += 1
+            print(f'{config_file}: {len(errors)} errors')
+            for error in errors:
+                print(f'  {error}')
+        else:
+            print(f'{config_file}: ok')
+
+    return 1 if n_invalid else 0
+
+
+def ensemble_command(args):
+    from ensemble import run_ensemble
+
+    print(run_ensemble(args.config_file))
+
+
+def analyze_command(args):
+    from hydrograph_analysis import analyze_runs
+
+    summary = analyze_runs(args.paths, args.interval, args.method, args.chunk_size)
+    if args.summary:
+        summary.to_csv(args.summary, index=False)
+    print(summary.to_string(index=False))
+
+
+def bench_command(args):
+    import runpy
+
+    script = os.path.join(repo_folder, 'benchmarks', f'{args.benchmark}_benchmark.py')
+    sys.argv = [script] + args.arguments
+    runpy.run_path(script, run_name='__main__')
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Flood Simulator')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the model')
+    run_parser.add_argument('config_files', nargs='*')
+    run_parser.add_argument('--resume', help='checkpoint file of a model run to continue')
+    run_parser.set_defaults(function=run_command)
+
+    validate_parser = subparsers.add_parser('validate', help='check configuration files')
+    validate_parser.add_argument('config_files', nargs='+')
+    validate_parser.set_defaults(function=validate_command)
+
+    ensemble_parser = subparsers.add_parser('ensemble', help='run an ensemble')
+    ensemble_parser.add_argument('config_file')
+    ensemble_parser.set_defaults(function=ensemble_command)
+
+    analyze_parser = subparsers.add_parser('analyze', help='analyze hydrographs of runs')
+    analyze_parser.add_argument('paths', nargs='+')
+    analyze_parser.add_argument('--interval', type=float, default=60,
+                                help='time interval (s) of the resampled hydrograph, '
+                                     '0 to skip')
+    analyze_parser.add_argument('--method', default='first', choices=RESAMPLE_METHODS)
+    analyze_parser.add_argument('--chunk-size', type=int, default=100000)
+    analyze_parser.add_argument('--summary', help='csv file to save the summary of the runs')
+    analyze_parser.set_defaults(function=analyze_command)
+
+    bench_parser = subparsers.add_parser('bench', help='run a benchmark')
+    bench_parser.add_argument('benchmark', choices=BENCHMARKS)
+    bench_parser.add_argument('arguments', nargs=argparse.REMAINDER,
+                              help='arguments of the benchmark script')
+    bench_parser.set_defaults(function=bench_command)
+
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'run' and not (args.config_files or args.resume):
+        parser.error('run needs configuration files or --resume')
+
+    return args.function(args) or 0
+
+
+if __name__ == "__main__":
+    """
+    Run a subcommand of the Flood Simulator.
+    """
+    sys.exit(main())
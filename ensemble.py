@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+
+"""
+Ensemble runs of the Flood Simulator
+
+Description:
+This code runs FloodSimulator for a set of scenarios (ensemble members) made
+from a base configuration file and a parameter sweep. The terrain file is
+read once and shared with all members, and the members run in a process pool.
+The worker processes are started with spawn (not fork), so they do not
+inherit the thread pools (numba, OpenMP) and threads of the parent process.
+A swept key that has no effect in a member (e.g. rain_intensity when a
+rain_file is set) raises a ValueError.
+A summary of the peak discharge, time to peak, max water depth and end time
+(with the reason of an early stop) of each member is saved as
+ensemble_summary.csv in the base output folder.
+
+Ensemble configuration file (toml-format):
+[ensemble]
+base_config = 'config_file.toml'
+workers = 4  # number of processes
+mode = 'product'  # 'product' for all combinations, 'zip' for paired values
+
+[ensemble.parameters]  # '<section>.<key>' = list of values
+"olf_info.rain_file" = ['']
+"olf_info.rain_intensity" = [30, 59.2]
+"olf_info.mannings_n" = [0.03, 0.05]
+
+Usage:
+method1
+from ensemble import run_ensemble
+summary = run_ensemble('ensemble_config.toml')
+
+method2
+$ python ensemble.py ensemble_config.toml
+
+"""
+
+import os
+import sys
+import copy
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+import numpy as np
+import pandas as pd
+
+from flood_simulator import FloodSimulator
+
+# terrain data shared by the members in each worker process
+_terrain_data = None
+
+
+def read_terrain_data(terrain):
+    """read the terrain file once as the terrain_data used by FloodSimulator"""
+    grid, dem_data = FloodSimulator.read_terrain_file(terrain)
+    dem_data.flags.writeable = False
+
+    return {
+        'shape': grid.shape,
+        'xy_spacing': (grid.dx, grid.dy),
+        'xy_of_lower_left': tuple(grid.xy_of_lower_left),
+        'elevation': dem_data,
+    }
+
+
+def get_ignored_reason(config, name):
+    """get why a swept key has no effect in a member configuration (None if it has one)"""
+    section, key = name.split('.', 1)
+    if name == 'olf_info.rain_intensity' and config['olf_info'].get('rain_file', ''):
+        return 'the rain of olf_info.rain_file is used'
+    if section == 'infil_info' and not config['model_run']['activate_inf']:
+        return 'model_run.activate_inf is false'
+
+    return None
+
+
+def get_members(base_config, parameters, mode='product'):
+    """make the configuration of each member from the parameter sweep"""
+    names = list(parameters.keys())
+    if mode == 'product':
+        combinations = itertools.product(*parameters.values())
+    elif mode == 'zip':
+        if len({len(values) for values in parameters.values()}) > 1:
+            raise ValueError('Parameter lists should have the same length in zip mode')
+        combinations = zip(*parameters.values())
+    else:
+        raise ValueError(f'Unsupported ensemble mode: {mode}')
+
+    members = []
+    for index, values in enumerate(combinations):
+        config = copy.deepcopy(base_config)
+        for name, value in zip(names, values):
+            section, key = name.split('.', 1)
+            config[section][key] = value
+        for name in names:
+            reason = get_ignored_reason(config, name)
+            if reason is not None:
+                raise ValueError(f'Parameter {name} has no effect in member {index}: {reason}')
+        config['output']['output_folder'] = os.path.join(
+            base_config['output']['output_folder'], f'member_{index:03d}')
+        members.append((index, dict(zip(names, values)), config))
+
+    return members
+
+
+def _init_worker(terrain_data):
+    global _terrain_data
+    _terrain_data = terrain_data
+
+
+def run_member(index, parameters, config):
+    """run one ensemble member and get the summary of the results"""
+    fs = FloodSimulator(**config, terrain_data=_terrain_data)
+    fs.run()
+
+    outlet_result = fs.hydrograph.to_array()
+    peak = np.argmax(outlet_result[:, 1]) if len(outlet_result) else None
+
+    return {
+        'member': index,
+        **parameters,
+        'peak_discharge': outlet_result[peak, 1] if peak is not None else np.nan,
+        'time_to_peak': outlet_result[peak, 0] if peak is not None else np.nan,
+        'max_depth': fs.model_grid.at_node['max_surface_water__depth'].max(),
+        'end_time': fs.run_summary['end_time'],
+        'stop_reason': fs.run_summary['stop_reason'],
+        'output_folder': config['output']['output_folder'],
+    }
+
+
+def run_ensemble(config_file):
+    """run all members of the ensemble and save the summary"""
+    with open(config_file, mode='rb') as fp:
+        ensemble = tomllib.load(fp)['ensemble']
+
+    with open(ensemble['base_config'], mode='rb') as fp:
+        base_config = tomllib.load(fp)
+
+    members = get_members(base_config, ensemble['parameters'],
+                          ensemble.get('mode', 'product'))
+
+    output_folder = base_config['output']['output_folder']
+    if not os.path.isdir(output_folder):
+        os.makedirs(output_folder)
+
+    # the terrain file is only read once
+    terrain_data = read_terrain_data(base_config['terrain'])
+
+    with ProcessPoolExecutor(max_workers=ensemble.get('workers', os.cpu_count()),
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker,
+                             initargs=(terrain_data,)) as executor:
+        futures = [executor.submit(run_member, *member) for member in members]
+        results = [future.result() for future in futures]
+
+    summary = pd.DataFrame(results)
+    summary.to_csv(os.path.join(output_folder, 'ensemble_summary.csv'), index=False)
+
+    return summary
+
+
+if __name__ == "__main__":
+    """
+    Launch ensemble runs for flood simulator.
+    Command-line argument is the path of an ensemble configuration file.
+    """
+
+    if len(sys.argv) > 1:
+        print(run_ensemble(sys.argv[1]))
+    else:
+        print('Please provide an ensemble configuration file path to run the model.')
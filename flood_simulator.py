@@ -21,24 +21,40 @@ fs.run()
 method2
 $ python flood_simulator.py config_file.toml
 
+continue a model run from a checkpoint (model_run.checkpoint_interval > 0)
+fs = FloodSimulator.from_checkpoint('output/checkpoint.npz')
+fs.run()
+$ python flood_simulator.py --resume output/checkpoint.npz
+
 """
 
 import sys
 import os
+import json
 
 try:
     import tomllib
 except ModuleNotFoundError:
     import tomli as tomllib
-import rasterio
-from tqdm import trange
-import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
+from landlab import RasterModelGrid
 from landlab.io import read_esri_ascii, write_esri_ascii
-from landlab import imshow_grid
-from landlab.components import OverlandFlow, SoilInfiltrationGreenAmpt
+
+from terrain_cache import get_cache_entry, load_terrain, save_terrain
+from forcing import RainfallForcing
+from hydrograph import HydrographRecorder
+from gauges import GaugeSet
+from olf_engine import get_overland_flow
+from infiltration import GreenAmptInfiltration
+from profiling import PhaseTimer, get_profile_settings, run_profiler
+from time_stepping import StopCondition, TimeStepController
+from mass_balance import WaterBudget
+from precision import get_dtype
+from options import FLOOD_METRICS
+from snapshot import SnapshotWriter
+from accumulators import (MaxAccumulator, PeakTimeAccumulator, MeanAccumulator,
+                          DurationAccumulator, CumulativeAccumulator)
 
 
 class FloodSimulator:
@@ -47,7 +63,9 @@ class FloodSimulator:
                  output,
                  model_run,
                  infil_info,
-                 olf_info):
+                 olf_info,
+                 gauges=None,
+                 terrain_data=None):
 
         """ Initialize FloodSimulator """
 
@@ -57,13 +75,49 @@ class FloodSimulator:
         self.infil_info = infil_info
         self.olf_info = olf_info
 
+        # data type of the model state, forcing and max fields (the elevation
+        # and the sums of the flood metrics and the water budget are float64)
+        self.dtype = get_dtype(self.model_run.get('precision', 'float64'))
+        if self.dtype != np.float64 and self.olf_info.get('engine', 'landlab') != 'numba':
+            raise ValueError("model_run.precision = 'float32' needs "
+                             "olf_info.engine = 'numba'")
+
+        # gauges besides the outlet (node ids, coordinates and cross-sections)
+        self.gauges = gauges if gauges is not None else {}
+
+        # parsed terrain data (e.g. shared by ensemble members) to skip reading
+        # grid_file. It is a dict with shape, xy_spacing, xy_of_lower_left and
+        # elevation (1D array)
+        self.terrain_data = terrain_data
+
         self.model_grid = None
         self.outlet_id = None
 
+        # watershed bounding box (row and column slices) of the original
+        # terrain extent when the grid is cropped
+        self.crop = None
+        self.full_grid = None
+
         self.rain_intensity = None
+        self.rain_forcing = None
         self.hydraulic_conductivity = None
 
+        self.max_depth = None
+        self.max_discharge = None
+        self.flood_metrics = []
+        self.hydrograph = None
+        self.run_summary = None
+
+        # model state loaded from a checkpoint file
+        self.checkpoint = None
+
+        # timing of the model phases (disabled by default)
+        enabled, self.profile_mode = get_profile_settings(self.output)
+        self.timer = PhaseTimer(enabled)
+
+        self.timer.start()
         self.setup_grid()
+        self.timer.lap('setup_grid')
 
     @classmethod
     def from_file(cls, config_file):
@@ -71,13 +125,134 @@ class FloodSimulator:
             args = tomllib.load(fp)
         return cls(**args)
 
+    @classmethod
+    def from_checkpoint(cls, checkpoint_file):
+        """create FloodSimulator to continue the model run saved in a checkpoint"""
+        with np.load(checkpoint_file) as data:
+            checkpoint = dict(data)
+
+        fs = cls(**json.loads(str(checkpoint['config'])))
+        fs.checkpoint = checkpoint
+        return fs
+
     def setup_grid(self):
         """create RasterModelGrid and add data fields"""
 
         # DEM field and set boundary condition
-        self.model_grid, dem_data = read_esri_ascii(self.terrain['grid_file'],
-                                                    name='topographic__elevation')
+        self.setup_terrain()
+
+        # surface water depth
+        if self.olf_info.get('surface_water_file', ''):
+            self.model_grid.add_field(
+                "surface_water__depth",
+                self.read_input_file(self.olf_info['surface_water_file'],
+                                     self.olf_info['surface_water_depth']).astype(self.dtype),
+                at='node')
+        else:
+            self.model_grid.add_full("surface_water__depth",
+                                     self.olf_info['surface_water_depth'],
+                                     dtype=self.dtype)
+
+        # soil water infiltration depth
+        if self.infil_info.get('soil_water_file', ''):
+            self.model_grid.add_field(
+                "soil_water_infiltration__depth",
+                self.read_input_file(self.infil_info['soil_water_file'],
+                                     self.infil_info['soil_water_infiltration_depth']
+                                     ).astype(self.dtype),
+                at='node')
+        else:
+            self.model_grid.add_full("soil_water_infiltration__depth",
+                                     self.infil_info['soil_water_infiltration_depth'],
+                                     dtype=self.dtype)
+
+        # link fields of the overland flow (OverlandFlow adds them as float64)
+        for name in ["surface_water__discharge", "surface_water__depth",
+                     "water_surface__gradient"]:
+            self.model_grid.add_zeros(name, at='link', dtype=self.dtype)
 
+        # maximum surface water depth (this field is added for result analysis)
+        self.max_depth = MaxAccumulator(self.model_grid, 'max_surface_water__depth',
+                                        dtype=self.dtype)
+
+        # maximum discharge (this field is added for result analysis)
+        self.max_discharge = MaxAccumulator(self.model_grid, 'test_max_discharge',
+                                            dtype=self.dtype)
+
+        # other flood metrics (these fields are added for result analysis)
+        self.setup_flood_metrics()
+
+        # add rain intensity
+        rain_frames = None
+        if self.olf_info.get('rain_frame_interval', 0) > 0:
+            # time-varying rain from a multi-band file or a list of files
+            from forcing import RainFrameReader
+
+            rain_frames = RainFrameReader(
+                self.olf_info['rain_file'],
+                frame_interval=self.olf_info['rain_frame_interval'] * 60,
+                interpolation=self.olf_info.get('rain_interpolation', 'hold'),
+                shape=self.get_extent_shape(),
+                resampling=self.terrain.get('resampling', 'nearest'),
+                node_values=self.crop_node_values)
+        elif self.olf_info['rain_file'] != '':
+            self.rain_intensity = self.read_input_file(self.olf_info['rain_file'], 0.0)
+        else:
+            self.rain_intensity = self.olf_info['rain_intensity']
+
+        # rainfall rate (m/s) of the model run
+        self.rain_forcing = RainfallForcing(
+            self.rain_intensity,
+            storm_duration=self.model_run['storm_duration'] * 60,
+            rain_frames=rain_frames,
+            hyetograph=self.olf_info.get('hyetograph'),
+            hyetograph_interval=self.olf_info.get('hyetograph_interval', 6) * 60,
+            number_of_nodes=self.model_grid.number_of_nodes,
+            dtype=self.dtype)
+
+        # add hydraulic conductivity
+        if self.infil_info['conductivity_file'] != '':
+            self.hydraulic_conductivity = self.read_input_file(
+                self.infil_info['conductivity_file'],
+                self.infil_info['hydraulic_conductivity']).astype(self.dtype)
+        else:
+            self.hydraulic_conductivity = self.infil_info['hydraulic_conductivity']
+
+    def setup_terrain(self):
+        """create RasterModelGrid with the DEM field and boundary condition"""
+
+        # load terrain from the cache
+        cache_entry = None
+        if self.terrain.get('cache_folder', '') and self.terrain_data is None \
+                and os.path.isfile(self.terrain['grid_file']):
+            cache_entry = get_cache_entry(
+                self.terrain['cache_folder'],
+                self.terrain['grid_file'],
+                {key: value for key, value in self.terrain.items()
+                 if key != 'cache_folder'})
+
+            if os.path.isdir(cache_entry):
+                self.model_grid, self.outlet_id, self.crop, self.full_grid = \
+                    load_terrain(cache_entry)
+                return
+
+        # DEM field
+        if self.terrain_data is None:
+            self.model_grid, dem_data = self.read_terrain_file(self.terrain)
+        else:
+            self.model_grid = RasterModelGrid(
+                self.terrain_data['shape'],
+                xy_spacing=self.terrain_data['xy_spacing'],
+                xy_of_lower_left=self.terrain_data['xy_of_lower_left'])
+            dem_data = self.model_grid.add_field('topographic__elevation',
+                                                 self.terrain_data['elevation'],
+                                                 at='node')
+
+        # crop grid to the watershed
+        if self.terrain.get('crop_to_watershed', False):
+            dem_data = self.crop_grid(dem_data)
+
+        # boundary condition
         if self.terrain['outlet_id'] < 0:
             id_array = self.model_grid.set_watershed_boundary_condition(
                                     dem_data,
@@ -85,69 +260,437 @@ class FloodSimulator:
                                     return_outlet_id=True)
             self.outlet_id = id_array[0]
         else:
-            self.outlet_id = self.terrain['outlet_id']
+            self.outlet_id = self.get_model_node_ids(self.terrain['outlet_id'])
             self.model_grid.set_watershed_boundary_condition_outlet_id(
                                     outlet_id=self.outlet_id,
                                     node_data=dem_data,
                                     nodata_value=self.terrain['nodata_value'])
 
-        # surface water depth TODO: allow tif input
-        self.model_grid.add_full("surface_water__depth",
-                                 self.olf_info['surface_water_depth'])
+        # save terrain to the cache
+        if cache_entry is not None:
+            os.makedirs(self.terrain['cache_folder'], exist_ok=True)
+            save_terrain(cache_entry, self.model_grid, self.outlet_id,
+                         self.crop, self.full_grid)
 
-        # soil water infiltration depth  TODO: allow tif input
-        self.model_grid.add_full("soil_water_infiltration__depth",
-                                 self.infil_info['soil_water_infiltration_depth'])
+    @staticmethod
+    def read_terrain_file(terrain):
+        """
+        read the DEM file (esri ascii or GeoTIFF) as RasterModelGrid with
+        topographic__elevation field.
+        """
+        from raster_io import is_raster_file, read_raster
+
+        if not is_raster_file(terrain['grid_file']):
+            return read_esri_ascii(terrain['grid_file'], name='topographic__elevation')
+
+        data, info = read_raster(terrain['grid_file'],
+                                 window=terrain.get('window', []),
+                                 decimation=terrain.get('decimation', 1))
+
+        # grid spacing
+        if terrain.get('cellsize', 0) > 0:
+            cellsize = terrain['cellsize'] * info['decimation']
+            xy_spacing = (cellsize, cellsize)
+            xy_of_lower_left = (0.0, 0.0)
+        elif info['is_geographic']:
+            raise ValueError('Please set terrain.cellsize (m) for a DEM file in '
+                             'geographic coordinates.')
+        else:
+            xy_spacing = info['xy_spacing']
+            xy_of_lower_left = info['xy_of_lower_left']
 
-        # maximum surface water depth (this field is added for result analysis)
-        self.model_grid.add_zeros('max_surface_water__depth', at='node')
+        # use nodata_value of the configuration for the nodata cells
+        dem_data = data.astype(float)
+        if info['nodata'] is not None:
+            dem_data[data == info['nodata']] = terrain['nodata_value']
+        dem_data[np.isnan(dem_data)] = terrain['nodata_value']
 
-        # maximum discharge (this field is added for result analysis)
-        self.model_grid.add_zeros('test_max_discharge', at='node')
+        model_grid = RasterModelGrid(info['shape'], xy_spacing=xy_spacing,
+                                     xy_of_lower_left=xy_of_lower_left)
+        model_grid.add_field('topographic__elevation', dem_data, at='node')
 
-        # add rain intensity TODO: allow 3D rain input
-        if self.olf_info['rain_file'] != '':
-            file = rasterio.open(self.olf_info['rain_file'])
-            data = file.read(1).flatten()
-            self.rain_intensity = data
-        else:
-            self.rain_intensity = self.olf_info['rain_intensity']
+        return model_grid, dem_data
 
-        # add hydraulic conductivity
-        if self.infil_info['conductivity_file'] != '':
-            file = rasterio.open(self.infil_info['conductivity_file'])
-            data = file.read(1).flatten()
-            self.hydraulic_conductivity = data
+    def crop_grid(self, dem_data):
+        """
+        crop the model grid to the bounding box of the watershed (nodes with
+        data) plus a buffer of crop_buffer nodes (at least 1 node).
+        """
+        full_grid = self.model_grid
+        dem_2d = dem_data.reshape(full_grid.shape)
+        rows, cols = np.where(dem_2d != self.terrain['nodata_value'])
+        buffer = max(self.terrain.get('crop_buffer', 1), 1)
+
+        row_start = max(rows.min() - buffer, 0)
+        row_end = min(rows.max() + buffer + 1, full_grid.shape[0])
+        col_start = max(cols.min() - buffer, 0)
+        col_end = min(cols.max() + buffer + 1, full_grid.shape[1])
+        self.crop = (slice(row_start, row_end), slice(col_start, col_end))
+
+        self.full_grid = full_grid
+        self.model_grid = RasterModelGrid(
+            (row_end - row_start, col_end - col_start),
+            xy_spacing=(full_grid.dx, full_grid.dy),
+            xy_of_lower_left=(full_grid.xy_of_lower_left[0] + col_start * full_grid.dx,
+                              full_grid.xy_of_lower_left[1] + row_start * full_grid.dy))
+
+        return self.model_grid.add_field('topographic__elevation',
+                                         dem_2d[self.crop].flatten(), at='node')
+
+    def get_extent_shape(self):
+        """get the shape of the terrain extent (before cropping)"""
+        return (self.model_grid if self.crop is None else self.full_grid).shape
+
+    def read_input_file(self, file_path, fill_value):
+        """
+        read an input raster file (e.g. rain, conductivity) as node values of
+        the model grid. nodata cells are set to fill_value.
+        """
+        from raster_io import read_grid_values
+
+        data = read_grid_values(file_path,
+                                shape=self.get_extent_shape(),
+                                resampling=self.terrain.get('resampling', 'nearest'),
+                                fill_value=fill_value)
+
+        return self.crop_node_values(data)
+
+    def crop_node_values(self, values):
+        """get node values on the cropped grid from values on the terrain extent"""
+        if self.crop is None or np.ndim(values) == 0:
+            return values
+
+        return values.reshape(self.full_grid.shape)[self.crop].flatten()
+
+    def get_model_node_ids(self, node_ids):
+        """convert node ids on the terrain extent to node ids of the model grid"""
+        if self.crop is None:
+            return node_ids
+
+        rows, cols = np.divmod(np.asarray(node_ids), self.full_grid.shape[1])
+        outside = ((rows < self.crop[0].start) | (rows >= self.crop[0].stop)
+                   | (cols < self.crop[1].start) | (cols >= self.crop[1].stop))
+        if np.any(outside):
+            raise ValueError(f'Nodes {list(np.asarray(node_ids)[outside])} are '
+                             f'outside the cropped model grid')
+
+        return ((rows - self.crop[0].start) * self.model_grid.shape[1]
+                + cols - self.crop[1].start)
+
+    def get_model_node_at_xy(self, x, y):
+        """get the model grid node nearest to map coordinates within the grid"""
+        x_min, y_min = self.model_grid.xy_of_lower_left
+        x_max = x_min + (self.model_grid.shape[1] - 1) * self.model_grid.dx
+        y_max = y_min + (self.model_grid.shape[0] - 1) * self.model_grid.dy
+        if not (x_min - self.model_grid.dx / 2 <= x <= x_max + self.model_grid.dx / 2
+                and y_min - self.model_grid.dy / 2 <= y <= y_max + self.model_grid.dy / 2):
+            raise ValueError(f'Gauge coordinate ({x:g}, {y:g}) is outside the model grid'
+                             + ('' if self.crop is None else ' (cropped to the watershed)'))
+
+        return self.model_grid.find_nearest_node((x, y))
+
+    def get_full_extent_values(self, values, fill_value=0):
+        """get node values on the terrain extent from values on the cropped grid"""
+        if self.crop is None:
+            return values
+
+        full_values = np.full(self.full_grid.shape, fill_value, dtype=values.dtype)
+        full_values[self.crop] = values.reshape(self.model_grid.shape)
+        return full_values.flatten()
+
+    def get_full_extent_link_values(self, values, fill_value=0):
+        """get link values on the terrain extent from values on the cropped grid"""
+        if self.crop is None:
+            return values
+
+        # links of the full grid from the tail node (east link of horizontal
+        # links and north link of vertical links)
+        tails = self.model_grid.node_at_link_tail
+        horizontal = self.model_grid.node_at_link_head - tails == 1
+        links = self.full_grid.links_at_node[
+            self.get_full_extent_node_ids(tails), np.where(horizontal, 0, 1)]
+
+        full_values = np.full(self.full_grid.number_of_links, fill_value,
+                              dtype=values.dtype)
+        full_values[links] = values
+        return full_values
+
+    def get_full_extent_node_ids(self, node_ids):
+        """convert node ids of the model grid to node ids on the terrain extent"""
+        if self.crop is None:
+            return node_ids
+
+        rows, cols = np.divmod(np.asarray(node_ids), self.model_grid.shape[1])
+        return ((rows + self.crop[0].start) * self.full_grid.shape[1]
+                + cols + self.crop[1].start)
+
+    def write_node_field(self, file_path, name):
+        """write a node field as esri ascii file on the terrain extent"""
+        if self.crop is None:
+            write_esri_ascii(file_path, self.model_grid, name, clobber=True)
         else:
-            self.hydraulic_conductivity = self.infil_info['hydraulic_conductivity']
+            self.full_grid.add_field(
+                name, self.get_full_extent_values(self.model_grid.at_node[name]),
+                at='node', clobber=True)
+            write_esri_ascii(file_path, self.full_grid, name, clobber=True)
+
+    def setup_flood_metrics(self):
+        """create accumulators for flood metrics listed in the output setting"""
+
+        for metric in self.output.get('flood_metrics', []):
+            if metric not in FLOOD_METRICS:
+                raise ValueError(f'Unsupported flood metric: {metric}')
+
+            if metric == 'max_depth_time':
+                accumulator = PeakTimeAccumulator(
+                    self.model_grid, 'max_surface_water__depth_time')
+                data_name = 'surface_water__depth'
+            elif metric == 'inundation_duration':
+                # the duration is updated at the active (wet) nodes only
+                threshold = self.output.get('inundation_depth', 0.01)
+                if threshold < self.olf_info.get('wet_depth', 0):
+                    raise ValueError(f'inundation_depth ({threshold} m) is below '
+                                     f'wet_depth ({self.olf_info["wet_depth"]} m)')
+                accumulator = DurationAccumulator(
+                    self.model_grid, 'surface_water__inundation_duration',
+                    threshold=threshold)
+                data_name = 'surface_water__depth'
+            elif metric == 'mean_depth':
+                accumulator = MeanAccumulator(
+                    self.model_grid, 'mean_surface_water__depth')
+                data_name = 'surface_water__depth'
+            else:
+                # flow_volume
+                accumulator = CumulativeAccumulator(
+                    self.model_grid, 'surface_water__flow_volume', at='link',
+                    scale=self.model_grid.dx)
+                data_name = 'surface_water__discharge'
+
+            self.flood_metrics.append((metric, accumulator, data_name))
+
+    def update_flood_metrics(self, elapsed_time, dt, nodes=None, links=None):
+        """
+        update flood metrics with the current water depth and discharge
+        (of the active nodes and links if given)
+        """
+        for metric, accumulator, data_name in self.flood_metrics:
+            data = self.model_grid[accumulator.at][data_name]
+            index = nodes if accumulator.at == 'node' else links
+            if index is None or accumulator.full_update:
+                accumulator.update(data, elapsed_time, dt)
+            else:
+                accumulator.update(data[index], elapsed_time, dt, index=index)
+
+    def get_accumulators(self):
+        """get all accumulators with names used in checkpoints"""
+        accumulators = {'max_depth': self.max_depth,
+                        'max_discharge': self.max_discharge}
+        for metric, accumulator, data_name in self.flood_metrics:
+            accumulators[metric] = accumulator
+
+        return accumulators
+
+    def save_checkpoint(self, file_path, time_slice, elapsed_time, step_count,
+                        hydrograph, snapshot_writer, states=None):
+        """
+        save the model state at the end of a time slice as a binary file.
+        states is a dict of other objects with get_state() (e.g. time stepper)
+        """
+        config = {'terrain': self.terrain, 'output': self.output,
+                  'model_run': self.model_run, 'infil_info': self.infil_info,
+                  'olf_info': self.olf_info, 'gauges': self.gauges}
+
+        data = {
+            'config': np.array(json.dumps(config)),
+            'time_slice': np.array(time_slice),
+            'elapsed_time': np.array(elapsed_time),
+            'step_count': np.array(step_count),
+            'snapshot_frames': np.array(
+                0 if snapshot_writer is None else len(snapshot_writer.times)),
+        }
+
+        for at in ['node', 'link']:
+            for name in self.model_grid[at]:
+                data[f'{at}__{name}'] = self.model_grid[at][name]
+
+        for name, accumulator in self.get_accumulators().items():
+            for key, value in accumulator.get_state().items():
+                data[f'accumulator__{name}__{key}'] = value
+
+        for key, value in hydrograph.get_state().items():
+            data[f'hydrograph__{key}'] = value
+
+        for name, state in (states or {}).items():
+            for key, value in state.get_state().items():
+                data[f'state__{name}__{key}'] = value
+
+        # write to a temporary file first to keep the old checkpoint if it fails
+        temp_file = file_path + '.tmp.npz'
+        np.savez(temp_file, **data)
+        os.replace(temp_file, file_path)
+
+    def restore_checkpoint(self):
+        """restore grid fields and accumulators from the checkpoint"""
+        for key, value in self.checkpoint.items():
+            if key.startswith(('node__', 'link__')):
+                at, name = key.split('__', 1)
+                if name in self.model_grid[at]:
+                    self.model_grid[at][name][:] = value
+                else:
+                    self.model_grid.add_field(name, value.copy(), at=at)
+
+        for name, accumulator in self.get_accumulators().items():
+            accumulator.set_state(
+                self.get_checkpoint_items(f'accumulator__{name}__'))
+
+    def get_checkpoint_items(self, prefix):
+        """get the checkpoint arrays with the key prefix (None if no checkpoint)"""
+        if self.checkpoint is None:
+            return None
+
+        return {key[len(prefix):]: value for key, value in self.checkpoint.items()
+                if key.startswith(prefix)}
+
+    def setup_gauges(self):
+        """
+        create the GaugeSet of the outlet (first gauge) and the gauges of the
+        gauges setting. Node ids are on the terrain extent and coordinates
+        are matched to the nearest node. Gauges outside the model grid
+        (e.g. outside the watershed crop) raise a ValueError.
+        """
+        # output.gauge_ids of older configuration files are node gauges
+        node_ids = list(self.gauges.get('node_ids', [])) + \
+            list(self.output.get('gauge_ids', []))
+        coordinates = list(self.gauges.get('coordinates', []))
+        cross_sections = list(self.gauges.get('cross_sections', []))
+
+        names = self.gauges.get('names', [])
+        if not names:
+            names = [str(node) for node in node_ids] + \
+                    [f'{x:g}_{y:g}' for x, y in coordinates] + \
+                    [f'xs{index}' for index in range(len(cross_sections))]
+
+        coordinate_nodes = [self.get_model_node_at_xy(x, y) for x, y in coordinates]
+
+        return GaugeSet(
+            self.model_grid,
+            node_ids=[self.outlet_id] + list(self.get_model_node_ids(node_ids))
+            + coordinate_nodes,
+            cross_sections=cross_sections,
+            names=[''] + list(names),
+            depth=self.gauges.get('depth', False))
+
+    def update_max_discharge(self, overland_flow, nodes=None):
+        """
+        update max discharge field with discharge at all nodes (or at the
+        active nodes, same values as OverlandFlow.discharge_mapper())
+        """
+        if nodes is None:
+            discharge = overland_flow.discharge_mapper(
+                self.model_grid.at_link["surface_water__discharge"],
+                convert_to_volume=True
+            )
+            self.max_discharge.update(discharge, None, None)
+            return
+
+        discharge = self.model_grid.at_link["surface_water__discharge"][
+            self.model_grid.links_at_node[nodes]] * self.model_grid.dx
+        discharge *= self.model_grid.link_dirs_at_node[nodes]
+        discharge[discharge < 0] = 0.0
+        self.max_discharge.update(discharge.sum(axis=1), None, None, index=nodes)
 
     def run(self):
+        """
+        run overland flow simulation (with a profiler if profile_mode is set)
+        """
+        if self.profile_mode:
+            return run_profiler(self.run_model, self.profile_mode,
+                                self.output['output_folder'])
+
+        return self.run_model()
+
+    @staticmethod
+    def get_slice_step(interval, time_step):
+        """
+        get the number of time slices between two outputs of an interval (s),
+        rounded up to whole time slices (0 if the interval is 0)
+        """
+        if interval <= 0:
+            return 0
+
+        return max(int(np.ceil(interval / time_step - 1e-9)), 1)
+
+    def run_model(self):
         """
         run overland flow simulation
         """
+        timer = self.timer
+        timer.start()
 
         # set model run parameters
         model_run_time = self.model_run['model_run_time'] * 60  # duration of run (s)
-        storm_duration = self.model_run['storm_duration'] * 60  # duration of rain (s)
         time_step = self.model_run['time_step'] * 60
         elapsed_time = 0.0
 
+        # time slices of the run loop (the last slice ends at or after
+        # model_run_time), slice k ends at k * time_step
+        n_slices = len(range(time_step, model_run_time + time_step, time_step))
+
         # output setup
-        outlet_times = []
-        outlet_discharge = []
         output_folder = self.output['output_folder']
 
         if not os.path.isdir(output_folder):
             os.mkdir(output_folder)
 
-        # instantiate overland flow component
-        overland_flow = OverlandFlow(self.model_grid,
-                                     steep_slopes=self.olf_info['steep_slopes'],
-                                     alpha=self.olf_info['alpha'],
-                                     mannings_n=self.olf_info['mannings_n'],
-                                     g=self.olf_info['g'],
-                                     theta=self.olf_info['theta'],
-                                     )
+        # outlet discharge (and discharge at other gauges)
+        gauge_set = self.setup_gauges()
+        hydrograph = HydrographRecorder(
+            gauge_set.columns,
+            interval=self.output.get('hydrograph_interval', 0) * 60,
+            buffer_size=self.output.get('hydrograph_buffer', 0),
+            stream_file=os.path.join(output_folder, 'outlet_discharge'),
+            plot_size=self.output.get('plot_points', 2000) if self.output['plot_olf'] else 0,
+            state=self.get_checkpoint_items('hydrograph__'))
+        self.hydrograph = hydrograph
+
+        # binary snapshots of fields at time slices
+        snapshot_writer = None
+        if self.output.get('snapshot_fields', []):
+            snapshot_step = self.get_slice_step(
+                self.output.get('snapshot_interval', 0) * 60, time_step) or 1
+            snapshot_writer = SnapshotWriter(
+                os.path.join(output_folder, 'snapshots'),
+                self.model_grid,
+                self.output['snapshot_fields'],
+                n_frames=n_slices // snapshot_step,
+                start_frame=0 if self.checkpoint is None
+                else int(self.checkpoint['snapshot_frames']),
+                full_grid=self.full_grid, crop=self.crop)
+
+        # plots made in the model loop or in background processes
+        plot_olf = self.output['plot_olf']
+        plot_inf = self.model_run['activate_inf'] and self.output['plot_inf']
+        renderer = None
+        if plot_olf or plot_inf:
+            from plotting import PlotRenderer, plot_flow, plot_infiltration
+
+            renderer = PlotRenderer(self.model_grid,
+                                    workers=self.output.get('plot_workers', 0),
+                                    queue_size=self.output.get('plot_queue_size', 4))
+
+        # instantiate overland flow component of the engine
+        overland_flow = get_overland_flow(self.model_grid,
+                                          engine=self.olf_info.get('engine', 'landlab'),
+                                          wet_depth=self.olf_info.get('wet_depth', 0),
+                                          n_tiles=self.olf_info.get('n_tiles', 1),
+                                          steep_slopes=self.olf_info['steep_slopes'],
+                                          alpha=self.olf_info['alpha'],
+                                          mannings_n=self.olf_info['mannings_n'],
+                                          g=self.olf_info['g'],
+                                          theta=self.olf_info['theta'],
+                                          )
+        # only the wet nodes and their neighbors are updated (numba engine)
+        active_set = self.olf_info.get('wet_depth', 0) > 0
 
         # instantiate infiltration component
         if self.model_run['activate_inf']:
@@ -159,7 +702,7 @@ class FloodSimulator:
                     self.infil_info[var_name] = None
 
             # create instance
-            infiltration = SoilInfiltrationGreenAmpt(
+            infiltration = GreenAmptInfiltration(
                 self.model_grid,
                 hydraulic_conductivity=self.hydraulic_conductivity,
                 soil_bulk_density = self.infil_info['soil_bulk_density'],
@@ -178,109 +721,249 @@ class FloodSimulator:
                     'wetting_front_capillary_pressure_head']
             )
 
+        # sub-step control (max/min step and holding a dry or steady state)
+        time_stepper = TimeStepController(
+            max_dt=self.model_run.get('max_dt', 0) or time_step,
+            min_dt=self.model_run.get('min_dt', 0),
+            stall_steps=self.model_run.get('stall_steps', 100),
+            storm_duration=self.rain_forcing.storm_duration,
+            dry_depth=self.model_run.get('dry_depth', 0),
+            steady_tolerance=self.model_run.get('steady_tolerance', 0))
+
+        # early stop of the run when the watershed drains
+        stop_condition = StopCondition(
+            storm_duration=self.rain_forcing.storm_duration,
+            stop_volume=self.model_run.get('stop_volume', 0),
+            stop_discharge=self.model_run.get('stop_discharge', 0),
+            stop_intervals=self.model_run.get('stop_intervals', 1))
+        core_nodes = self.model_grid.core_nodes
+        cell_area = self.model_grid.dx * self.model_grid.dy
+
+        # water budget of the core nodes (mass balance)
+        water_budget = None
+        if self.output.get('mass_balance', True):
+            water_budget = WaterBudget(self.model_grid)
+            water_budget.start()
+
+        # objects with a state saved in the checkpoint
+        run_states = {'time_stepper': time_stepper, 'stop_condition': stop_condition}
+        if water_budget is not None:
+            run_states['water_budget'] = water_budget
+
+        # number of steps between max discharge updates (0: once per time step)
+        max_discharge_interval = self.output.get('max_discharge_interval', 1)
+        step_count = 0
+
+        # checkpoint setup
+        checkpoint_step = self.get_slice_step(
+            self.model_run.get('checkpoint_interval', 0) * 60, time_step)
+        checkpoint_file = os.path.join(output_folder, 'checkpoint.npz')
+        start_time = time_step
+
+        # continue the model run from a checkpoint
+        if self.checkpoint is not None:
+            self.restore_checkpoint()
+            elapsed_time = float(self.checkpoint['elapsed_time'])
+            step_count = int(self.checkpoint['step_count'])
+            start_time = int(self.checkpoint['time_slice']) + time_step
+
+            for name, state in run_states.items():
+                items = self.get_checkpoint_items(f'state__{name}__')
+                if items:
+                    state.set_state(items)
+
+        timer.lap('setup')
+        timer.start()
+
         # run model simulation
-        for time_slice in trange(time_step, model_run_time + time_step, time_step):
+        from tqdm import trange
+
+        for time_slice in trange(start_time, model_run_time + time_step, time_step):
+
+            if time_stepper.hold and elapsed_time < time_slice:
+                # dry or steady state after the storm: hold the model state
+                # to the end of the time slice. The held water is at rest, so
+                # the hydrograph and the discharge metrics add no flow, like
+                # the outflow of the water budget
+                self.model_grid.at_link['surface_water__discharge'].fill(0)
+                self.update_flood_metrics(time_slice, time_slice - elapsed_time)
+                elapsed_time = float(time_slice)
+                hydrograph.record(elapsed_time, gauge_set.sample(
+                    self.model_grid.at_link["surface_water__discharge"],
+                    self.model_grid.at_node["surface_water__depth"]))
+                timer.lap('hold')
 
+            slice_start_time = elapsed_time
             while elapsed_time < time_slice:
                 # get adaptive time step
-                overland_flow.dt = min(overland_flow.calc_time_step(), time_step)
-
-                # set rainfall intensity
-                if elapsed_time < storm_duration:
-                    overland_flow.rainfall_intensity = self.rain_intensity/(1000 * 3600)
-                else:
-                    overland_flow.rainfall_intensity = 0.0
+                overland_flow.dt = time_stepper.get_dt(overland_flow.calc_time_step(),
+                                                       elapsed_time)
+                timer.lap('calc_time_step')
+                if time_stepper.stalled:
+                    break
+
+                # set rainfall intensity (only when the rainfall rate changes)
+                rain_rate = self.rain_forcing.get_rate(elapsed_time)
+                if rain_rate is not overland_flow.rainfall_intensity:
+                    overland_flow.rainfall_intensity = rain_rate
+                timer.lap('rainfall')
 
                 # run model
                 overland_flow.overland_flow(dt=overland_flow.dt)
+                timer.lap('overland_flow')
+
+                # nodes and links of the active set (None for all)
+                active_nodes = active_links = None
+                if active_set:
+                    active_nodes = overland_flow.get_active_nodes()
+                    active_links = overland_flow.get_active_links()
 
                 if self.model_run['activate_inf']:
-                    infiltration.run_one_step(overland_flow.dt)
+                    infiltration.run_one_step(overland_flow.dt, nodes=active_nodes)
+                    timer.lap('infiltration')
+
+                if water_budget is not None:
+                    water_budget.add_step(overland_flow.dt, rain_rate)
+                    timer.lap('mass_balance')
 
                 # update elapsed time
                 elapsed_time += overland_flow.dt
+                timer.add_step(overland_flow.dt)
+
+                # update flood metrics (result analysis)
+                self.update_flood_metrics(elapsed_time, overland_flow.dt,
+                                          nodes=active_nodes, links=active_links)
+                timer.lap('flood_metrics')
 
                 # get discharge result at outlet
-                discharge = overland_flow.discharge_mapper(
+                hydrograph.record(elapsed_time, gauge_set.sample(
                     self.model_grid.at_link["surface_water__discharge"],
-                    convert_to_volume=True
-                )
-
-                outlet_discharge.append(discharge[self.outlet_id])
-                outlet_times.append(elapsed_time)
+                    self.model_grid.at_node["surface_water__depth"]))
+                timer.lap('gauge_discharge')
 
                 # save the max discharge at each time step (result analysis)
-                self.model_grid.at_node['test_max_discharge'] = np.maximum(
-                    self.model_grid.at_node['test_max_discharge'],
-                    discharge
-                )
-
-            # # save surface water depth at each time step
-            # write_esri_ascii(os.path.join(output_folder,
-            #                  "water_depth_{}.asc".format(time_slice)),
-            #                  self.model_grid, 'surface_water__depth', clobber=True)
+                step_count += 1
+                if max_discharge_interval > 0 and \
+                        step_count % max_discharge_interval == 0:
+                    self.update_max_discharge(overland_flow, nodes=active_nodes)
+                    timer.lap('max_discharge')
+
+            # the run stalled at the start of the time slice (the outputs are
+            # saved to the end of the last time slice)
+            if time_stepper.stalled and elapsed_time == slice_start_time:
+                break
+
+            if max_discharge_interval <= 0:
+                self.update_max_discharge(overland_flow)
+                timer.lap('max_discharge')
+
+            timer.end_interval(time_slice)
+
+            if water_budget is not None:
+                water_budget.record(elapsed_time)
+                timer.lap('mass_balance')
+
+            # stop the run when the time step stalls in the time slice
+            # (outputs are saved to the time of the stall)
+            if time_stepper.stalled:
+                self.max_depth.update(self.model_grid.at_node['surface_water__depth'],
+                                      elapsed_time, time_step)
+                break
+
+            # check for a dry or steady state
+            time_stepper.update(time_slice, self.model_grid.at_node['surface_water__depth'])
+
+            # save snapshots of the fields (e.g. surface water depth)
+            if snapshot_writer is not None and \
+                    (time_slice // time_step) % snapshot_step == 0:
+                snapshot_writer.write(time_slice)
+                timer.lap('snapshot')
 
             # save the max water depth at each time step
-            self.model_grid.at_node['max_surface_water__depth'] = np.maximum(
-                self.model_grid.at_node['max_surface_water__depth'],
-                self.model_grid.at_node['surface_water__depth'])
+            self.max_depth.update(self.model_grid.at_node['surface_water__depth'],
+                                  time_slice, time_step)
+            timer.lap('max_depth')
 
             # plot overland flow results
-            if self.output['plot_olf']:
-                fig, ax = plt.subplots(
-                    2, 1, figsize=(8, 9), gridspec_kw={"height_ratios": [1, 1.5]}
-                )
-                fig.suptitle("Results at {} min".format(time_slice / 60))
-
-                ax[0].plot(outlet_times, outlet_discharge, "-")
-                ax[0].set_xlabel("Time elapsed (s)")
-                ax[0].set_ylabel("discharge (cms)")
-                ax[0].set_title("Water discharge at the outlet")
-
-                imshow_grid(
-                    self.model_grid,
-                    "surface_water__depth",
-                    cmap="Blues",
-                    var_name="surface water depth (m)",
-                )
-                ax[1].set_title("")
-                ax[1].set_xlabel('east-west distance (m)')
-                ax[1].set_ylabel('north-south distance (m)')
-
-                plt.close(fig)
-                fig.savefig(os.path.join(output_folder, f"flow_{time_slice}.png"))
+            if plot_olf:
+                renderer.submit(
+                    plot_flow,
+                    os.path.join(output_folder, f"flow_{time_slice}.png"),
+                    time_slice,
+                    self.model_grid.at_node['surface_water__depth'].copy(),
+                    hydrograph.get_plot_series())
 
             # plot infiltration result
-            if self.model_run['activate_inf'] and self.output['plot_inf']:
-                fig, ax = plt.subplots(figsize=(8, 9))
-                imshow_grid(
-                    self.model_grid,
-                    "soil_water_infiltration__depth",
-                    cmap="Blues",
-                    var_name=" soil water infiltration depth (m)",
-                )
-                ax.set_title("")
-                ax.set_xlabel('east-west distance (m)')
-                ax.set_ylabel('north-south distance (m)')
-
-                plt.close(fig)
-                fig.savefig(os.path.join(output_folder, f"infil_{time_slice}.png"))
+            if plot_inf:
+                renderer.submit(
+                    plot_infiltration,
+                    os.path.join(output_folder, f"infil_{time_slice}.png"),
+                    self.model_grid.at_node['soil_water_infiltration__depth'].copy())
+            timer.lap('plotting')
+
+            # save model state
+            if checkpoint_step > 0 and (time_slice // time_step) % checkpoint_step == 0:
+                self.save_checkpoint(checkpoint_file, time_slice, elapsed_time,
+                                     step_count, hydrograph, snapshot_writer,
+                                     states=run_states)
+                timer.lap('checkpoint')
+
+            # stop the run when the watershed drains
+            if stop_condition.enabled and stop_condition.update(
+                    time_slice,
+                    self.model_grid.at_node['surface_water__depth'][core_nodes].sum()
+                    * cell_area,
+                    gauge_set.get_discharge(
+                        self.model_grid.at_link["surface_water__discharge"])[0]):
+                break
+
+        # wait for the plots
+        if renderer is not None:
+            renderer.close()
+        timer.lap('plotting')
+
+        self.rain_forcing.close()
+
+        if snapshot_writer is not None:
+            snapshot_writer.close()
 
         # save outlet discharge
-        outlet_result = pd.DataFrame(list(zip(outlet_times, outlet_discharge)),
-                                     columns=['time', 'discharge'])
-        outlet_result.to_csv(os.path.join(
+        hydrograph.close()
+        hydrograph.to_csv(os.path.join(
             self.output['output_folder']
             if os.path.isdir(self.output['output_folder']) else os.getcwd(),
             'outlet_discharge.csv')
         )
 
+        # save the summary of the model run (end time and early stop)
+        self.run_summary = {
+            'model_run_time': model_run_time,
+            'end_time': elapsed_time,
+            'steps': step_count,
+            'stop_reason': 'stalled' if time_stepper.stalled else stop_condition.stop_reason,
+            'stop_time': time_stepper.stall_time if time_stepper.stalled
+            else stop_condition.stop_time,
+            'hold_reason': time_stepper.hold_reason,
+            'hold_time': time_stepper.hold_time,
+        }
+        if water_budget is not None:
+            water_budget.to_csv(os.path.join(output_folder, 'mass_balance.csv'))
+            budget = water_budget.get_budget(elapsed_time)
+            self.run_summary.update(mass_balance_error=budget['error'],
+                                    mass_balance_relative_error=budget['relative_error'])
+        with open(os.path.join(output_folder, 'run_summary.json'), 'w') as fp:
+            json.dump({key: None if isinstance(value, float) and np.isnan(value)
+                       else value for key, value in self.run_summary.items()},
+                      fp, indent=2)
+
         # save max surface water depth
+        import pandas as pd
+
         max_depth = self.model_grid.at_node['max_surface_water__depth']
         max_depth[max_depth == 1e-12] = 0
 
         # as csv
-        df = pd.DataFrame(max_depth, columns=['z_value'])
+        df = pd.DataFrame(self.get_full_extent_values(max_depth), columns=['z_value'])
         df.to_csv(os.path.join(
             self.output['output_folder']
             if os.path.isdir(self.output['output_folder']) else os.getcwd(),
@@ -288,21 +971,46 @@ class FloodSimulator:
         )
 
         # as ascii
-        write_esri_ascii(os.path.join(output_folder, "max_water_depth.asc"),
-                         self.model_grid, 'max_surface_water__depth', clobber=True)
-
-        write_esri_ascii(os.path.join(output_folder, "max_discharge.asc"),
-                         self.model_grid, 'test_max_discharge', clobber=True
-                         )
+        self.write_node_field(os.path.join(output_folder, "max_water_depth.asc"),
+                              'max_surface_water__depth')
+
+        self.write_node_field(os.path.join(output_folder, "max_discharge.asc"),
+                              'test_max_discharge')
+
+        # save the final water depths (input files to warm start another run)
+        if self.output.get('save_state', False):
+            self.write_node_field(os.path.join(output_folder, "surface_water_depth.asc"),
+                                  'surface_water__depth')
+            self.write_node_field(
+                os.path.join(output_folder, "soil_water_infiltration_depth.asc"),
+                'soil_water_infiltration__depth')
+
+        # save flood metrics
+        for metric, accumulator, data_name in self.flood_metrics:
+            if accumulator.at == 'node':
+                self.write_node_field(os.path.join(output_folder, f"{metric}.asc"),
+                                      accumulator.name)
+            else:
+                df = pd.DataFrame(self.get_full_extent_link_values(accumulator.values),
+                                  columns=[accumulator.name])
+                df.to_csv(os.path.join(output_folder, f"{metric}.csv"))
+
+        # save the timing report
+        timer.lap('output')
+        timer.save(output_folder)
 
 
 if __name__ == "__main__":
     """
     Launch a model run for flood simulator. 
-    Command-line argument is the path of a configuration file (toml-format). 
+    Command-line argument is the path of a configuration file (toml-format)
+    or --resume with the path of a checkpoint file.
     """
 
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2 and sys.argv[1] == '--resume':
+        fs = FloodSimulator.from_checkpoint(sys.argv[2])
+        fs.run()
+    elif len(sys.argv) > 1:
         config_file = sys.argv[1]
         fs = FloodSimulator.from_file(config_file)
         fs.run()
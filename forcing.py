@@ -0,0 +1,314 @@
+"""
+Rainfall forcing for the model run
+
+RainfallForcing converts the rainfall input (mm/hr) to the rainfall rate (m/s)
+used by OverlandFlow. The rates are validated and converted once and kept as
+read-only arrays, which only change when the forcing changes (a new radar
+frame, a new hyetograph interval or the end of the storm).
+
+A hyetograph distributes the rainfall of the storm over time. The SCS 24-hour
+design storms (type I, IA, II and III) are scaled to the storm duration, or
+a list of relative intensities can be used. The total rain depth of the storm
+is the same as with the constant rainfall intensity.
+
+RainFrameReader reads time-varying rainfall (e.g. radar products) from a
+multi-band raster file (one band per frame) or a list of single band raster
+files. Frames are read lazily and the next frames are read on a background
+thread ahead of the model time, so only a few frames are kept in memory.
+Between frames the rainfall is held or linearly interpolated. The storm
+ends with the last frame.
+
+Usage:
+from forcing import RainfallForcing, RainFrameReader
+rain_frames = RainFrameReader('radar.tif', frame_interval=300)
+rain = rain_frames.get_rain(elapsed_time)  # mm/hr at each node
+
+rain_forcing = RainfallForcing(59.2, storm_duration=3600, hyetograph='scs_type_ii')
+overland_flow.rainfall_intensity = rain_forcing.get_rate(elapsed_time)  # m/s
+rain_forcing.close()
+
+"""
+
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from options import HYETOGRAPHS, RAIN_INTERPOLATIONS
+from raster_io import read_grid_values
+
+
+# SCS 24-hour rainfall distributions (NRCS TR-55), time (hr) and cumulative
+# fraction of the storm depth (options.HYETOGRAPHS)
+SCS_TIME = [0, 2, 4, 6, 7, 8, 8.5, 9, 9.5, 9.75, 10, 10.5, 11, 11.5, 11.75,
+            12, 12.5, 13, 13.5, 14, 16, 20, 24]
+SCS_FRACTIONS = {
+    'scs_type_i': [0, 0.035, 0.076, 0.125, 0.156, 0.194, 0.219, 0.254, 0.303,
+                   0.362, 0.515, 0.583, 0.624, 0.654, 0.669, 0.682, 0.706,
+                   0.727, 0.748, 0.767, 0.830, 0.926, 1.0],
+    'scs_type_ia': [0, 0.050, 0.116, 0.206, 0.268, 0.425, 0.480, 0.520, 0.550,
+                    0.564, 0.577, 0.601, 0.624, 0.645, 0.655, 0.664, 0.683,
+                    0.701, 0.719, 0.736, 0.800, 0.906, 1.0],
+    'scs_type_ii': [0, 0.022, 0.048, 0.080, 0.098, 0.120, 0.133, 0.147, 0.163,
+                    0.172, 0.181, 0.204, 0.235, 0.283, 0.357, 0.663, 0.735,
+                    0.772, 0.799, 0.820, 0.880, 0.952, 1.0],
+    'scs_type_iii': [0, 0.020, 0.043, 0.072, 0.089, 0.115, 0.130, 0.148, 0.167,
+                     0.178, 0.189, 0.216, 0.250, 0.298, 0.339, 0.500, 0.702,
+                     0.751, 0.785, 0.811, 0.886, 0.957, 1.0],
+}
+
+
+def get_rain_rate(rain_intensity, number_of_nodes=None, nodata=None, dtype=float):
+    """
+    convert rainfall intensity (mm/hr) to a read-only rainfall rate (m/s).
+    nodata and nan values are set to 0. Node values are stored as dtype.
+    """
+    if np.ndim(rain_intensity) == 0:
+        if rain_intensity < 0:
+            raise ValueError('Rainfall intensity must be positive')
+        return rain_intensity / (1000 * 3600)
+
+    rain_intensity = np.array(rain_intensity, dtype=float).flatten()
+    if number_of_nodes is not None and rain_intensity.size != number_of_nodes:
+        raise ValueError(f'Rainfall input has {rain_intensity.size} values, '
+                         f'expected {number_of_nodes} (one value per grid node).')
+
+    mask = ~np.isfinite(rain_intensity)
+    if nodata is not None:
+        mask |= rain_intensity == nodata
+    rain_intensity[mask] = 0.0
+
+    if np.any(rain_intensity < 0):
+        raise ValueError('Rainfall intensity must be positive')
+
+    rain_rate = (rain_intensity / (1000 * 3600)).astype(dtype, copy=False)
+    rain_rate.flags.writeable = False
+
+    return rain_rate
+
+
+def get_hyetograph(hyetograph, storm_duration, interval):
+    """
+    get the relative rainfall intensity (mean of 1) of each interval of the storm.
+
+    hyetograph: name of a SCS design storm or a list of relative intensities
+                of equal intervals over the storm duration
+    storm_duration: duration (s) of the storm
+    interval: time (s) of the design storm intervals
+
+    returns (factors, interval)
+    """
+    if isinstance(hyetograph, str):
+        if hyetograph not in HYETOGRAPHS:
+            raise ValueError(f'Unsupported hyetograph: {hyetograph}')
+
+        n_intervals = max(int(np.ceil(storm_duration / interval)), 1)
+        interval = storm_duration / n_intervals
+        times = np.linspace(0, 24, n_intervals + 1)
+        fractions = np.interp(times, SCS_TIME, SCS_FRACTIONS[hyetograph])
+        factors = np.diff(fractions) * n_intervals
+    else:
+        factors = np.asarray(hyetograph, dtype=float)
+        if len(factors) == 0 or np.any(factors < 0) or factors.sum() == 0:
+            raise ValueError('Hyetograph should be a list of positive values')
+        interval = storm_duration / len(factors)
+        factors = factors / factors.mean()
+
+    return factors, interval
+
+
+class RainFrameReader:
+    def __init__(self,
+                 rain_file,
+                 frame_interval,
+                 interpolation='hold',
+                 prefetch=2,
+                 shape=None,
+                 resampling='nearest',
+                 node_values=None):
+        """
+        rain_file: multi-band raster file or a list of raster files (mm/hr)
+        frame_interval: time (s) between frames, the first frame starts at 0 s
+        interpolation: 'hold' to keep the frame value until the next frame,
+                       'linear' to interpolate between frames
+        prefetch: number of frames read ahead on the background thread
+        shape: (nrows, ncols) of the grid, frames with a different resolution
+               are resampled
+        resampling: rasterio resampling method of the frames
+        node_values: function to convert a frame to the model node values
+                     (e.g. crop to the model grid)
+        """
+
+        if interpolation not in RAIN_INTERPOLATIONS:
+            raise ValueError(f'Unsupported rain interpolation: {interpolation}')
+
+        if isinstance(rain_file, str):
+            import rasterio
+
+            with rasterio.open(rain_file) as src:
+                self.frames = [(rain_file, band) for band in range(1, src.count + 1)]
+        else:
+            self.frames = [(file, 1) for file in rain_file]
+
+        self.frame_interval = frame_interval
+        self.interpolation = interpolation
+        self.prefetch = max(prefetch, 1 if interpolation == 'linear' else 0)
+        self.shape = shape
+        self.resampling = resampling
+        self.node_values = node_values
+
+        self._frames = {}
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def duration(self):
+        """time (s) when the last frame ends"""
+        return len(self.frames) * self.frame_interval
+
+    def _read_frame(self, index):
+        file, band = self.frames[index]
+        # frames are streamed, so they are not kept in the raster cache
+        data = read_grid_values(file, shape=self.shape, band=band,
+                                resampling=self.resampling, fill_value=0.0,
+                                cache=False)
+
+        if self.node_values is not None:
+            data = self.node_values(data)
+
+        data.flags.writeable = False
+        return data
+
+    def get_frame(self, index):
+        """get the frame data and read the next frames in the background"""
+        for next_index in range(index, min(index + self.prefetch + 1, len(self.frames))):
+            if next_index not in self._frames:
+                self._frames[next_index] = self._executor.submit(self._read_frame,
+                                                                 next_index)
+
+        # remove old frames
+        for old_index in [i for i in self._frames if i < index]:
+            del self._frames[old_index]
+
+        return self._frames[index].result()
+
+    def get_frame_index(self, time):
+        """get the frame index at time (s), None after the last frame"""
+        index = int(time // self.frame_interval)
+
+        return index if index < len(self.frames) else None
+
+    def get_rain(self, time):
+        """get rainfall intensity (mm/hr) at time (s)"""
+        index = self.get_frame_index(time)
+        if index is None:
+            return 0.0
+
+        frame = self.get_frame(index)
+        if self.interpolation == 'hold' or index + 1 >= len(self.frames):
+            return frame
+
+        # the next frame is read with the prefetch of get_frame()
+        weight = time / self.frame_interval - index
+        return frame * (1 - weight) + self._frames[index + 1].result() * weight
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._frames = {}
+
+
+class RainfallForcing:
+    def __init__(self,
+                 rain_intensity=0.0,
+                 storm_duration=np.inf,
+                 rain_frames=None,
+                 hyetograph=None,
+                 hyetograph_interval=360,
+                 number_of_nodes=None,
+                 nodata=None,
+                 dtype=float):
+        """
+        rain_intensity: rainfall intensity (mm/hr), a value or node values
+        storm_duration: duration (s) of rain
+        rain_frames: RainFrameReader of time-varying rain, used instead of
+                     rain_intensity. The rain ends with the last frame
+                     (storm_duration is replaced by the frame duration)
+        hyetograph: None for constant rain, name of a SCS design storm or a
+                    list of relative intensities
+        hyetograph_interval: time (s) of the SCS design storm intervals
+        number_of_nodes: expected number of node values
+        nodata: nodata value of the rain_intensity
+        dtype: data type of the rainfall rate of nodes (e.g. np.float32)
+        """
+
+        if rain_frames is not None:
+            if np.isfinite(storm_duration) and storm_duration != rain_frames.duration:
+                warnings.warn(f'storm_duration ({storm_duration:g} s) is replaced by the '
+                              f'duration of the rain frames ({rain_frames.duration:g} s)')
+            storm_duration = rain_frames.duration
+
+        self.storm_duration = storm_duration
+        self.rain_frames = rain_frames
+        self.number_of_nodes = number_of_nodes
+        self.dtype = dtype
+        self.rain_rate = None
+
+        if rain_frames is None:
+            self.rain_rate = get_rain_rate(rain_intensity, number_of_nodes, nodata,
+                                           dtype)
+
+        self.factors = None
+        if hyetograph:
+            if not np.isfinite(storm_duration):
+                raise ValueError('Hyetograph needs a storm duration')
+            self.factors, self.hyetograph_interval = get_hyetograph(
+                hyetograph, storm_duration, hyetograph_interval)
+
+        self._key = None
+        self._rate = None
+
+    def get_key(self, time):
+        """get the key of the forcing at time (s), the rate changes with the key"""
+        if time >= self.storm_duration:
+            return None
+
+        frame = 0
+        if self.rain_frames is not None:
+            frame = self.rain_frames.get_frame_index(time)
+            if frame is None:
+                return None
+            if self.rain_frames.interpolation == 'linear':
+                frame = time
+
+        interval = 0
+        if self.factors is not None:
+            interval = min(int(time // self.hyetograph_interval), len(self.factors) - 1)
+
+        return frame, interval
+
+    def get_rate(self, time):
+        """get rainfall rate (m/s) at time (s)"""
+        key = self.get_key(time)
+        if key is None:
+            return 0.0
+
+        if key != self._key:
+            if self.rain_frames is not None:
+                rate = get_rain_rate(self.rain_frames.get_rain(time), self.number_of_nodes,
+                                     dtype=self.dtype)
+            else:
+                rate = self.rain_rate
+
+            if self.factors is not None:
+                rate = rate * self.factors[key[1]]
+                if np.ndim(rate):
+                    rate = rate.astype(self.dtype, copy=False)
+                    rate.flags.writeable = False
+
+            self._key = key
+            self._rate = rate
+
+        return self._rate
+
+    def close(self):
+        if self.rain_frames is not None:
+            self.rain_frames.close()
@@ -0,0 +1,147 @@
+"""
+Virtual gauges of discharge and water depth
+
+GaugeSet samples discharge (and optionally water depth) at gauge nodes and
+cross-sections of the model grid. The links of all gauges are found once,
+so each sample is one gather of the link discharge and one sum for each gauge,
+and adding gauges costs little in the model loop.
+
+- node gauge: discharge flowing into the node (same as the outlet discharge
+  of OverlandFlow.discharge_mapper()), depth at the node
+- cross-section: net discharge across a polyline, positive for flow to the
+  right of the polyline direction (from the first to the last point), mean
+  depth of the nodes of the crossed links. Lines drawn between node centres
+  cross each link once.
+
+Usage:
+from gauges import GaugeSet
+gauges = GaugeSet(model_grid, node_ids=[outlet_id, 1200],
+                  cross_sections=[[[100, 250], [400, 250]]], depth=True)
+values = gauges.sample(model_grid.at_link['surface_water__discharge'],
+                       model_grid.at_node['surface_water__depth'])
+
+"""
+
+import numpy as np
+
+
+class GaugeSet:
+    def __init__(self,
+                 grid,
+                 node_ids=(),
+                 cross_sections=(),
+                 names=None,
+                 depth=False):
+        """
+        grid: model grid
+        node_ids: ids of the gauge nodes
+        cross_sections: polylines [[x, y], ...] in map coordinates
+        names: names of the gauges (node_ids then cross_sections), node id
+               and xs<index> by default. The columns of a gauge with an empty
+               name are 'discharge' and 'depth' (e.g. the outlet)
+        depth: sample water depth at the gauges
+        """
+        self.grid = grid
+        self.depth = depth
+
+        n_gauges = len(node_ids) + len(cross_sections)
+        if names is None:
+            names = [str(node) for node in node_ids] + \
+                    [f'xs{index}' for index in range(len(cross_sections))]
+        elif len(names) != n_gauges:
+            raise ValueError(f'{len(names)} gauge names for {n_gauges} gauges')
+        self.names = list(names)
+
+        # links, signs (discharge to the gauge) and nodes of each gauge
+        links, signs, clip, nodes = [], [], [], []
+        for node in node_ids:
+            node_links = grid.links_at_node[node]
+            node_dirs = grid.link_dirs_at_node[node]
+            links.append(node_links[node_dirs != 0])
+            signs.append(node_dirs[node_dirs != 0].astype(float))
+            clip.append(np.ones(len(links[-1]), dtype=bool))
+            nodes.append(np.array([node]))
+
+        for index, polyline in enumerate(cross_sections):
+            line_links, line_signs = self.get_crossed_links(polyline)
+            if len(line_links) == 0:
+                raise ValueError(f'Cross-section {self.names[len(node_ids) + index]} '
+                                 f'does not cross any active link.')
+            links.append(line_links)
+            signs.append(line_signs)
+            clip.append(np.zeros(len(line_links), dtype=bool))
+            nodes.append(np.unique(np.concatenate([
+                grid.node_at_link_tail[line_links], grid.node_at_link_head[line_links]])))
+
+        self.links = np.concatenate(links) if links else np.empty(0, dtype=int)
+        self.weights = np.concatenate(signs) * grid.dx if signs else np.empty(0)
+        self.clip = np.concatenate(clip) if clip else np.empty(0, dtype=bool)
+        self.link_starts = np.cumsum([0] + [len(value) for value in links[:-1]])
+
+        self.depth_nodes = np.concatenate(nodes) if nodes else np.empty(0, dtype=int)
+        self.node_starts = np.cumsum([0] + [len(value) for value in nodes[:-1]])
+        self.node_counts = np.array([len(value) for value in nodes])
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_crossed_links(self, polyline):
+        """get the active links crossed by a polyline and the sign of the discharge"""
+        grid = self.grid
+        points = np.asarray(polyline, dtype=float)
+        active_links = grid.active_links
+        tail = np.column_stack([grid.x_of_node[grid.node_at_link_tail[active_links]],
+                                grid.y_of_node[grid.node_at_link_tail[active_links]]])
+        head = np.column_stack([grid.x_of_node[grid.node_at_link_head[active_links]],
+                                grid.y_of_node[grid.node_at_link_head[active_links]]])
+        link_vector = head - tail
+
+        crossed = {}
+        for start, end in zip(points[:-1], points[1:]):
+            segment = end - start
+            denominator = segment[0] * link_vector[:, 1] - segment[1] * link_vector[:, 0]
+            offset = tail - start
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = (offset[:, 0] * link_vector[:, 1]
+                     - offset[:, 1] * link_vector[:, 0]) / denominator
+                u = (offset[:, 0] * segment[1] - offset[:, 1] * segment[0]) / denominator
+
+            # half-open ranges so that a link is not counted twice at a
+            # vertex of the polyline or at a node on the line
+            (index,) = np.nonzero((denominator != 0) & (t >= 0) & (t < 1)
+                                  & (u >= 0) & (u < 1))
+            for link, cross in zip(active_links[index], denominator[index]):
+                # link to the right of the segment: positive discharge
+                crossed.setdefault(link, -1.0 if cross > 0 else 1.0)
+
+        links = np.array(sorted(crossed), dtype=int)
+        return links, np.array([crossed[link] for link in links])
+
+    @property
+    def columns(self):
+        """names of the sampled values"""
+        columns = [f'discharge_{name}' if name else 'discharge' for name in self.names]
+        if self.depth:
+            columns += [f'depth_{name}' if name else 'depth' for name in self.names]
+
+        return columns
+
+    def get_discharge(self, link_discharge):
+        """get discharge (cms) at the gauges"""
+        if len(self.links) == 0:
+            return np.empty(0)
+
+        discharge = link_discharge[self.links] * self.weights
+        discharge[self.clip & (discharge < 0)] = 0.0
+
+        return np.add.reduceat(discharge, self.link_starts)
+
+    def sample(self, link_discharge, depth=None):
+        """get discharge (and depth) at the gauges as one array"""
+        discharge = self.get_discharge(link_discharge)
+        if not self.depth:
+            return discharge
+
+        gauge_depth = np.add.reduceat(depth[self.depth_nodes], self.node_starts) \
+            / self.node_counts
+        return np.concatenate([discharge, gauge_depth])
@@ -0,0 +1,256 @@
+"""
+Hydrograph recorder for model outputs
+
+It keeps time series values (e.g. discharge at gauge nodes) in a growable
+numpy array instead of python lists. Records can be downsampled to a fixed
+time interval and streamed to a binary file so that the memory use stays
+bounded for long model runs. For plots, the time and the first column are
+also kept in a fixed-size buffer: when it is full, every other record is
+dropped and only every second record is kept from then on, so the plotted
+series covers the whole run with at most plot_size records.
+
+Binary file format:
+- <name>.bin: float64 values in row order (time, column1, column2, ...)
+- <name>.json: metadata with the column names and data type. The number of
+  records and complete = true are added when the recorder is closed, so the
+  file of an interrupted run is not read as a complete hydrograph.
+
+Usage:
+from hydrograph import HydrographRecorder
+hydrograph = HydrographRecorder(['discharge'], interval=60)
+hydrograph.record(elapsed_time, [outlet_discharge])
+hydrograph.to_csv('outlet_discharge.csv')
+series = hydrograph.get_plot_series()  # with plot_size > 0
+
+"""
+
+import os
+import json
+
+import numpy as np
+
+
+class HydrographRecorder:
+    def __init__(self,
+                 columns,
+                 interval=0,
+                 buffer_size=0,
+                 stream_file=None,
+                 initial_size=1024,
+                 plot_size=0,
+                 state=None):
+        """
+        columns: names of the recorded values (time column is added)
+        interval: time interval (s) to downsample records, 0 to keep all
+        buffer_size: rows kept in memory before writing to stream_file,
+                     0 to keep all records in memory
+        stream_file: path of the binary file (without suffix) for streaming.
+                     A stream file of an earlier run is removed when the
+                     records are kept in memory (buffer_size 0)
+        plot_size: max records of the series for plots (time and the first
+                   column), 0 to skip
+        state: records from get_state() to continue a model run
+        """
+
+        self.columns = ['time'] + list(columns)
+        self.interval = interval
+        self.buffer_size = buffer_size
+        self.stream_file = stream_file
+        self.n_streamed = 0
+
+        self._next_time = 0.0
+        self._size = 0
+        self._data = np.empty(
+            (buffer_size if buffer_size > 0 else initial_size, len(self.columns)))
+
+        # downsampled series for plots: records with index % plot_stride == 0
+        # and the last record
+        self.plot_size = plot_size
+        self._plot_data = np.empty((max(plot_size, 0), 2))
+        self._plot_count = 0
+        self._plot_stride = 1
+        self._last = np.full(2, np.nan)
+
+        if self.buffer_size > 0:
+            if self.stream_file is None:
+                raise ValueError('stream_file is required when buffer_size > 0')
+
+            self._write_info(complete=False)
+            open(self.stream_file + '.bin', 'ab').close()
+        elif self.stream_file is not None:
+            for suffix in ['.json', '.bin']:
+                if os.path.isfile(self.stream_file + suffix):
+                    os.remove(self.stream_file + suffix)
+
+        if state is not None:
+            self.set_state(state)
+        elif self.buffer_size > 0:
+            open(self.stream_file + '.bin', 'wb').close()
+
+    def __len__(self):
+        return self.n_streamed + self._size
+
+    def record(self, time, values):
+        """add values at time (s) to the hydrograph"""
+
+        # downsample records to the first value in each interval
+        if self.interval > 0:
+            if time < self._next_time:
+                return
+            self._next_time = (time // self.interval + 1) * self.interval
+
+        if self._size == len(self._data):
+            if self.buffer_size > 0:
+                self.flush()
+            else:
+                self._data = np.resize(self._data, (2 * len(self._data),
+                                                    len(self.columns)))
+
+        self._data[self._size, 0] = time
+        self._data[self._size, 1:] = values
+        if self.plot_size > 0:
+            self._add_plot_record(self._data[self._size, :2])
+        self._size += 1
+
+    def _add_plot_record(self, row):
+        index = len(self)
+        self._last[:] = row
+        if index % self._plot_stride:
+            return
+
+        if self._plot_count == self.plot_size:
+            # keep every other record (index % (2 * stride) == 0)
+            kept = self._plot_data[:self._plot_count:2]
+            self._plot_count = len(kept)
+            self._plot_data[:self._plot_count] = kept
+            self._plot_stride *= 2
+            if index % self._plot_stride:
+                return
+
+        self._plot_data[self._plot_count] = row
+        self._plot_count += 1
+
+    def get_plot_series(self):
+        """get the downsampled time and first column (at most plot_size + 1 records)"""
+        series = self._plot_data[:self._plot_count]
+        if len(series) and series[-1, 0] != self._last[0]:
+            series = np.vstack([series, self._last])
+
+        return series.copy()
+
+    def get_state(self):
+        """get the records in memory and the streaming status as arrays"""
+        return {
+            'data': self._data[:self._size].copy(),
+            'n_streamed': np.array(self.n_streamed),
+            'next_time': np.array(self._next_time),
+            'plot_data': self._plot_data[:self._plot_count].copy(),
+            'plot_stride': np.array(self._plot_stride),
+            'last': self._last.copy(),
+        }
+
+    def set_state(self, state):
+        """restore the records from get_state()"""
+        self.n_streamed = int(state['n_streamed'])
+        self._next_time = float(state['next_time'])
+
+        # remove records streamed after the state was saved
+        if self.buffer_size > 0:
+            row_bytes = len(self.columns) * np.dtype(np.float64).itemsize
+            os.truncate(self.stream_file + '.bin', self.n_streamed * row_bytes)
+
+        data = state['data']
+        self._size = len(data)
+        if self._size > len(self._data):
+            self._data = np.empty((self._size, len(self.columns)))
+        self._data[:self._size] = data
+
+        if 'plot_data' in state and self.plot_size > 0:
+            plot_data = state['plot_data'][-self.plot_size:]
+            self._plot_count = len(plot_data)
+            self._plot_data[:self._plot_count] = plot_data
+            self._plot_stride = int(state['plot_stride'])
+            self._last[:] = state['last']
+
+    def flush(self):
+        """write records in memory to the stream file"""
+        if self.buffer_size > 0 and self._size > 0:
+            with open(self.stream_file + '.bin', 'ab') as fp:
+                self._data[:self._size].tofile(fp)
+            self.n_streamed += self._size
+            self._size = 0
+
+    def _chunks(self, chunk_size=100000):
+        """iterate over all records in chunks"""
+        if self.n_streamed > 0:
+            streamed = np.memmap(self.stream_file + '.bin', dtype=np.float64,
+                                 mode='r', shape=(self.n_streamed, len(self.columns)))
+            for start in range(0, self.n_streamed, chunk_size):
+                yield streamed[start:start + chunk_size]
+
+        if self._size > 0:
+            yield self._data[:self._size]
+
+    def to_array(self):
+        """get all records as a 2D array (time in the first column)"""
+        chunks = list(self._chunks())
+        if not chunks:
+            return np.empty((0, len(self.columns)))
+
+        return np.concatenate(chunks)
+
+    def to_csv(self, file_path, chunk_size=100000):
+        """save all records as a csv file"""
+        import pandas as pd
+
+        start = 0
+        header = True
+        for chunk in self._chunks(chunk_size):
+            df = pd.DataFrame(chunk, columns=self.columns,
+                              index=np.arange(start, start + len(chunk)))
+            df.to_csv(file_path, mode='w' if header else 'a', header=header)
+            start += len(chunk)
+            header = False
+
+        if header:
+            pd.DataFrame(columns=self.columns).to_csv(file_path)
+
+    def _write_info(self, complete):
+        info = {'columns': self.columns, 'dtype': 'float64'}
+        if complete:
+            info.update(n_records=self.n_streamed, complete=True)
+
+        with open(self.stream_file + '.json', 'w') as fp:
+            json.dump(info, fp)
+
+    def close(self):
+        """write remaining records to the stream file and mark it complete"""
+        self.flush()
+        if self.buffer_size > 0:
+            self._write_info(complete=True)
+
+
+def is_hydrograph_complete(stream_file):
+    """check if a streamed hydrograph file was closed with all its records"""
+    stream_file = os.path.splitext(stream_file)[0]
+    if not (os.path.isfile(stream_file + '.json') and os.path.isfile(stream_file + '.bin')):
+        return False
+
+    with open(stream_file + '.json') as fp:
+        meta = json.load(fp)
+
+    row_bytes = np.dtype(meta['dtype']).itemsize * len(meta['columns'])
+    return meta.get('complete', False) and \
+        os.path.getsize(stream_file + '.bin') == meta['n_records'] * row_bytes
+
+
+def read_hydrograph(stream_file, mmap_mode='r'):
+    """read a streamed hydrograph file as (columns, 2D array)"""
+    stream_file = os.path.splitext(stream_file)[0]
+
+    with open(stream_file + '.json') as fp:
+        meta = json.load(fp)
+
+    data = np.memmap(stream_file + '.bin', dtype=meta['dtype'], mode=mmap_mode)
+
+    return meta['columns'], data.reshape(-1, len(meta['columns']))
@@ -0,0 +1,272 @@
+#! /usr/bin/env python
+
+"""
+Analysis of the model hydrographs
+
+Description:
+This code computes the cumulative discharge volume, peak discharge, time to
+peak, runoff ratio and a resampled hydrograph from the outlet_discharge.csv
+file or the streamed binary hydrograph (outlet_discharge.bin/.json) of model
+runs. The files are read in chunks, so the memory use does not depend on the
+length of the model run. The volume of each record is discharge * time since
+the previous record, like the outflow of the model water budget. Only the
+discharge columns (outlet and discharge_<gauge>) are analyzed, the depth
+columns of the gauges are skipped.
+
+The runoff ratio is the discharge volume divided by the rain volume, which is
+read from mass_balance.csv of the run (or given as rain_volume).
+
+A folder with ensemble_summary.csv is analyzed as the folders of the members.
+
+Usage:
+method1
+from hydrograph_analysis import analyze_run, analyze_runs
+summary, resampled = analyze_run('output', interval=60)
+summary = analyze_runs(['output_1', 'output_2'])
+
+method2
+$ python hydrograph_analysis.py output --interval 60
+$ python hydrograph_analysis.py output_1 output_2 ensemble_output --summary summary.csv
+
+"""
+
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from hydrograph import is_hydrograph_complete, read_hydrograph
+from options import RESAMPLE_METHODS
+
+
+def find_hydrograph_file(path):
+    """
+    get the hydrograph file of a run folder, the streamed binary hydrograph
+    if it is complete (the run closed it), otherwise the csv file
+    """
+    if not os.path.isdir(path):
+        return path
+
+    stream_file = os.path.join(path, 'outlet_discharge')
+    if is_hydrograph_complete(stream_file):
+        return stream_file + '.json'
+    if os.path.isfile(stream_file + '.csv'):
+        return stream_file + '.csv'
+
+    raise FileNotFoundError(f'No hydrograph file in {path}')
+
+
+def get_discharge_columns(columns):
+    """get the indices of the discharge columns (outlet and gauges)"""
+    return [index for index, column in enumerate(columns)
+            if column == 'discharge' or column.startswith('discharge_')]
+
+
+def iter_hydrograph(file_path, chunk_size=100000):
+    """iterate over a hydrograph file as (columns, 2D array chunk) with time first"""
+    if os.path.splitext(file_path)[1] in ['.bin', '.json']:
+        columns, data = read_hydrograph(file_path)
+        for start in range(0, len(data), chunk_size):
+            yield columns, np.asarray(data[start:start + chunk_size])
+    else:
+        for df in pd.read_csv(file_path, index_col=0, chunksize=chunk_size):
+            yield list(df.columns), df.to_numpy(dtype=float)
+
+
+class HydrographAnalyzer:
+    def __init__(self, columns, interval=0, method='first'):
+        """
+        columns: names of the discharge columns
+        interval: time interval (s) of the resampled hydrograph, 0 to skip
+        method: value of a resampled interval, 'first' record, time weighted
+                'mean' or 'max'
+        """
+        if method not in RESAMPLE_METHODS:
+            raise ValueError(f'Unsupported resample method: {method}')
+
+        self.columns = list(columns)
+        self.interval = interval
+        self.method = method
+
+        n_columns = len(self.columns)
+        self.volume = np.zeros(n_columns)
+        self.peak = np.full(n_columns, -np.inf)
+        self.time_to_peak = np.full(n_columns, np.nan)
+        self.last_time = 0.0
+        self.n_records = 0
+
+        # resampled rows and the (open) last interval of the previous chunk
+        self.rows = []
+        self._open = None
+
+    def update(self, time, values):
+        """add records (time and 2D values) in time order"""
+        if len(time) == 0:
+            return
+
+        dt = np.diff(time, prepend=self.last_time)
+        self.last_time = time[-1]
+        self.n_records += len(time)
+        self.volume += (values * dt[:, None]).sum(axis=0)
+
+        peak_index = values.argmax(axis=0)
+        chunk_peak = values[peak_index, np.arange(values.shape[1])]
+        is_peak = chunk_peak > self.peak
+        self.peak[is_peak] = chunk_peak[is_peak]
+        self.time_to_peak[is_peak] = time[peak_index[is_peak]]
+
+        if self.interval > 0:
+            self._resample(time, values, dt)
+
+    def _resample(self, time, values, dt):
+        bins = np.floor(time / self.interval).astype(np.int64)
+        bin_ids, starts = np.unique(bins, return_index=True)
+
+        # values of each interval in the chunk
+        parts = {
+            'first': values[starts],
+            'sum': np.add.reduceat(values * dt[:, None], starts, axis=0),
+            'dt': np.add.reduceat(dt, starts),
+            'max': np.maximum.reduceat(values, starts, axis=0),
+        }
+
+        # merge the first interval with the open interval of the last chunk
+        if self._open is not None and self._open['bin'] == bin_ids[0]:
+            parts['first'][0] = self._open['first']
+            parts['sum'][0] += self._open['sum']
+            parts['dt'][0] += self._open['dt']
+            parts['max'][0] = np.maximum(parts['max'][0], self._open['max'])
+        elif self._open is not None:
+            self._close_interval(self._open)
+
+        # the last interval can continue in the next chunk
+        for index, bin_id in enumerate(bin_ids):
+            part = {key: value[index] for key, value in parts.items()}
+            part['bin'] = bin_id
+            if index < len(bin_ids) - 1:
+                self._close_interval(part)
+            else:
+                self._open = part
+
+    def _close_interval(self, part):
+        if self.method == 'first':
+            values = part['first']
+        elif self.method == 'mean':
+            values = part['sum'] / part['dt'] if part['dt'] > 0 else part['first']
+        else:
+            values = part['max']
+
+        self.rows.append(np.concatenate([[part['bin'] * self.interval], values]))
+
+    def get_resampled(self):
+        """get the resampled hydrograph as a DataFrame"""
+        if self._open is not None:
+            self._close_interval(self._open)
+            self._open = None
+
+        return pd.DataFrame(np.array(self.rows).reshape(-1, len(self.columns) + 1),
+                            columns=['time'] + self.columns)
+
+    def get_summary(self, rain_volume=None):
+        """get the volume, peak, time to peak and runoff ratio of each column"""
+        summary = pd.DataFrame({
+            'column': self.columns,
+            'records': self.n_records,
+            'end_time': self.last_time,
+            'volume': self.volume,
+            'peak_discharge': np.where(np.isfinite(self.peak), self.peak, np.nan),
+            'time_to_peak': self.time_to_peak,
+        })
+        summary['runoff_ratio'] = summary['volume'] / rain_volume \
+            if rain_volume else np.nan
+
+        return summary
+
+
+def get_rain_volume(run_folder):
+    """get the rain volume (m3) of a run from mass_balance.csv (None if missing)"""
+    file_path = os.path.join(run_folder, 'mass_balance.csv')
+    if not os.path.isfile(file_path):
+        return None
+
+    budget = pd.read_csv(file_path, usecols=['rain'])
+    return budget['rain'].iloc[-1] if len(budget) else None
+
+
+def analyze_run(path, interval=0, method='first', rain_volume=None,
+                chunk_size=100000):
+    """
+    analyze the hydrograph of a run folder (or a hydrograph file).
+    returns (summary, resampled) DataFrames, resampled is None if interval is 0.
+    """
+    file_path = find_hydrograph_file(path)
+
+    analyzer = None
+    for columns, chunk in iter_hydrograph(file_path, chunk_size):
+        if analyzer is None:
+            discharge_columns = get_discharge_columns(columns)
+            analyzer = HydrographAnalyzer([columns[index] for index in discharge_columns],
+                                          interval, method)
+        analyzer.update(chunk[:, 0], chunk[:, discharge_columns])
+
+    if analyzer is None:
+        raise ValueError(f'No records in {file_path}')
+
+    if rain_volume is None:
+        rain_volume = get_rain_volume(os.path.dirname(os.path.abspath(file_path)))
+
+    summary = analyzer.get_summary(rain_volume)
+    summary.insert(0, 'run', path)
+
+    return summary, analyzer.get_resampled() if interval > 0 else None
+
+
+def get_run_folders(paths):
+    """get run folders, an ensemble folder is replaced by its member folders"""
+    folders = []
+    for path in paths:
+        ensemble_summary = os.path.join(path, 'ensemble_summary.csv')
+        if os.path.isfile(ensemble_summary):
+            folders += list(pd.read_csv(ensemble_summary)['output_folder'])
+        else:
+            folders.append(path)
+
+    return folders
+
+
+def analyze_runs(paths, interval=0, method='first', chunk_size=100000,
+                 resampled_file='discharge_analysis.csv'):
+    """
+    analyze the runs (or ensembles) and get the summary of all runs.
+    resampled hydrographs are saved as resampled_file in each run folder.
+    """
+    summaries = []
+    for folder in get_run_folders(paths):
+        summary, resampled = analyze_run(folder, interval, method,
+                                         chunk_size=chunk_size)
+        if resampled is not None and resampled_file and os.path.isdir(folder):
+            resampled.to_csv(os.path.join(folder, resampled_file), index=False)
+        summaries.append(summary)
+
+    return pd.concat(summaries, ignore_index=True)
+
+
+if __name__ == "__main__":
+    """
+    Analyze hydrographs of model runs.
+    Command-line arguments are run folders, hydrograph files or ensemble folders.
+    """
+    parser = argparse.ArgumentParser(description='Analyze hydrographs of model runs')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--interval', type=float, default=60,
+                        help='time interval (s) of the resampled hydrograph, 0 to skip')
+    parser.add_argument('--method', default='first', choices=RESAMPLE_METHODS)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--summary', help='csv file to save the summary of the runs')
+    args = parser.parse_args()
+
+    summary = analyze_runs(args.paths, args.interval, args.method, args.chunk_size)
+    if args.summary:
+        summary.to_csv(args.summary, index=False)
+    print(summary.to_string(index=False))
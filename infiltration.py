@@ -0,0 +1,69 @@
+"""
+Green-Ampt infiltration of a set of nodes
+
+GreenAmptInfiltration is SoilInfiltrationGreenAmpt of Landlab with the nodes
+to update as an option of run_one_step (e.g. the active nodes of the numba
+overland flow engine), so the work of a sub-step scales with the flooded area.
+The infiltration of the given nodes is the same as SoilInfiltrationGreenAmpt.
+The other nodes do not infiltrate their water (below wet_depth).
+
+Usage:
+from infiltration import GreenAmptInfiltration
+infiltration = GreenAmptInfiltration(model_grid, hydraulic_conductivity=1e-6)
+infiltration.run_one_step(dt, nodes=overland_flow.get_active_nodes())
+
+"""
+
+import numpy as np
+from landlab.components import SoilInfiltrationGreenAmpt
+
+from precision import get_component_info
+
+
+def _at_nodes(value, nodes):
+    """get the values of a parameter (scalar or value of each node) at nodes"""
+    return value[nodes] if np.ndim(value) > 0 else value
+
+
+class GreenAmptInfiltration(SoilInfiltrationGreenAmpt):
+    def __init__(self, grid, **kwds):
+        # fields can be float32 (model_run.precision)
+        self._info = get_component_info(SoilInfiltrationGreenAmpt._info, grid)
+        super().__init__(grid, **kwds)
+
+    def run_one_step(self, dt, nodes=None):
+        """
+        update the surface water depth and infiltration depth of nodes
+        (None for all nodes) for a time step dt (s)
+        """
+        if nodes is None:
+            return super().run_one_step(dt)
+
+        water_depth_field = self._grid.at_node["surface_water__depth"]
+        infiltration_depth_field = self._grid.at_node["soil_water_infiltration__depth"]
+        water_depth = water_depth_field[nodes]
+        infiltration_depth = infiltration_depth_field[nodes]
+
+        assert np.all(infiltration_depth >= 0.0)
+
+        wettingfront_depth = infiltration_depth / _at_nodes(self._moisture_deficit, nodes)
+        potential_infilt = (
+            dt
+            * _at_nodes(self._hydraulic_conductivity, nodes)
+            * (
+                (wettingfront_depth + _at_nodes(self._capillary_pressure, nodes)
+                 + water_depth)
+                / wettingfront_depth
+            )
+        )
+        np.clip(potential_infilt, 0.0, None, out=potential_infilt)
+
+        available_water = water_depth - _at_nodes(self._min_water, nodes)
+        np.clip(available_water, 0.0, None, out=available_water)
+
+        actual_infiltration = np.choose(
+            potential_infilt > available_water, (potential_infilt, available_water)
+        )
+
+        water_depth_field[nodes] = water_depth - actual_infiltration
+        infiltration_depth_field[nodes] = infiltration_depth + actual_infiltration
@@ -0,0 +1,134 @@
+"""
+Water budget of the model run
+
+WaterBudget adds up the rain volume on the core nodes and the volume leaving
+the core nodes through the open boundary (the outlet) at each model sub-step,
+and compares them with the change of the surface water and the infiltrated
+water on the core nodes. The mass-balance error is
+
+error = rain - outflow - infiltration - change of surface water storage
+
+The per-step sums only use the rain rate (recomputed when the rate changes)
+and the discharge of the boundary links. The storage and infiltration are
+summed at the end of each time step of the model run (time slice).
+
+The sums are float64 when the model fields are float32.
+
+Usage:
+from mass_balance import WaterBudget
+water_budget = WaterBudget(model_grid)
+water_budget.start()
+water_budget.add_step(dt, rain_rate)  # after each sub-step
+water_budget.record(time_slice)
+water_budget.to_csv('mass_balance.csv')
+
+"""
+
+import numpy as np
+
+
+class WaterBudget:
+    columns = ['time', 'rain', 'outflow', 'infiltration', 'storage_change',
+               'error', 'relative_error']
+
+    def __init__(self, grid):
+        """grid: model grid with surface_water__depth field"""
+        self.grid = grid
+        self.core_nodes = grid.core_nodes
+        self.cell_area = grid.dx * grid.dy
+
+        # active links between core nodes and open boundary nodes, and the
+        # sign of the discharge leaving the core nodes
+        active_links = grid.active_links
+        head_is_core = np.isin(grid.node_at_link_head[active_links], self.core_nodes)
+        tail_is_core = np.isin(grid.node_at_link_tail[active_links], self.core_nodes)
+        self.boundary_links = active_links[head_is_core != tail_is_core]
+        self.boundary_link_signs = np.where(tail_is_core[head_is_core != tail_is_core],
+                                            1.0, -1.0)
+
+        self.rain_volume = 0.0
+        self.outflow_volume = 0.0
+        self.initial_storage = 0.0
+        self.initial_infiltration = 0.0
+        self.records = []
+
+        self._rain_rate = None
+        self._rain_flux = 0.0
+
+    def get_storage(self):
+        """get the surface water volume (m3) on the core nodes"""
+        return self.grid.at_node['surface_water__depth'][self.core_nodes].sum(
+            dtype=np.float64) * self.cell_area
+
+    def get_infiltration(self):
+        """get the infiltrated water volume (m3) on the core nodes"""
+        if 'soil_water_infiltration__depth' not in self.grid.at_node:
+            return 0.0
+
+        return self.grid.at_node['soil_water_infiltration__depth'][
+            self.core_nodes].sum(dtype=np.float64) * self.cell_area
+
+    def start(self):
+        """save the initial storage and infiltration"""
+        self.initial_storage = self.get_storage()
+        self.initial_infiltration = self.get_infiltration()
+
+    def add_step(self, dt, rain_rate):
+        """add the rain and outflow of a sub-step"""
+        if rain_rate is not self._rain_rate:
+            # rain volume (m3/s) on the core nodes
+            self._rain_rate = rain_rate
+            if np.ndim(rain_rate) == 0:
+                self._rain_flux = rain_rate * len(self.core_nodes) * self.cell_area
+            else:
+                self._rain_flux = rain_rate[self.core_nodes].sum(dtype=np.float64) \
+                    * self.cell_area
+
+        self.rain_volume += self._rain_flux * dt
+
+        link_discharge = self.grid.at_link['surface_water__discharge']
+        self.outflow_volume += (link_discharge[self.boundary_links]
+                                * self.boundary_link_signs).sum(dtype=np.float64) \
+            * self.grid.dx * dt
+
+    def get_budget(self, time):
+        """get the cumulative volumes (m3) and the mass-balance error at time"""
+        infiltration = self.get_infiltration() - self.initial_infiltration
+        storage_change = self.get_storage() - self.initial_storage
+        error = self.rain_volume - self.outflow_volume - infiltration - storage_change
+
+        return {
+            'time': time,
+            'rain': self.rain_volume,
+            'outflow': self.outflow_volume,
+            'infiltration': infiltration,
+            'storage_change': storage_change,
+            'error': error,
+            'relative_error': error / self.rain_volume if self.rain_volume else np.nan,
+        }
+
+    def record(self, time):
+        """save the budget at the end of a time slice"""
+        self.records.append(self.get_budget(time))
+
+    def to_csv(self, file_path):
+        import pandas as pd
+
+        pd.DataFrame(self.records, columns=self.columns).to_csv(file_path, index=False)
+
+    def get_state(self):
+        return {
+            'rain_volume': np.array(self.rain_volume),
+            'outflow_volume': np.array(self.outflow_volume),
+            'initial_storage': np.array(self.initial_storage),
+            'initial_infiltration': np.array(self.initial_infiltration),
+            'records': np.array([[record[column] for column in self.columns]
+                                 for record in self.records]).reshape(-1, len(self.columns)),
+        }
+
+    def set_state(self, state):
+        self.rain_volume = float(state['rain_volume'])
+        self.outflow_volume = float(state['outflow_volume'])
+        self.initial_storage = float(state['initial_storage'])
+        self.initial_infiltration = float(state['initial_infiltration'])
+        self.records = [dict(zip(self.columns, row)) for row in state['records']]
@@ -0,0 +1,671 @@
+"""
+Overland flow engines of the model run
+
+Description:
+The overland flow is solved by the engine set as olf_info.engine:
+- 'landlab': OverlandFlow component of Landlab
+- 'numba': NumbaOverlandFlow, the same de Almeida et al. (2012) scheme of
+  OverlandFlow (same steep_slopes, alpha, mannings_n, theta and g settings and
+  the same fields) written as loops over the raster that are compiled with
+  numba. A sub-step is one pass over the links (water depth and slope at the
+  links, discharge and the steep slope limits) and one pass over the nodes
+  (flux divergence, rain and water depth) instead of many array operations.
+
+The kernels work on a range of rows of the raster, so the grid can be split in
+strips of rows. numba is only needed for the 'numba' engine, the kernels are
+compiled at the first use (and cached in __pycache__).
+
+With wet_depth > 0, the numba engine only updates the active set: the wet
+nodes (water depth above wet_depth or rain) and a halo of one cell, kept as a
+span of columns in each row. The spans grow and shrink at each sub-step, and
+the discharge of links between two dry nodes is zero, so the work of a
+sub-step scales with the flooded area. Water below wet_depth on dry nodes
+does not flow (OverlandFlow moves it as a very thin film).
+
+With n_tiles > 1, the numba engine splits the raster in strips of rows (tiles)
+that are updated by n_tiles threads (the kernels release the GIL). The fields
+are shared, so a tile reads the rows next to it (the halo) after a barrier
+between the phases of a sub-step, and the time step of a sub-step is the min
+of the time steps of the tiles (from the max water depth of each tile). The
+results are the same as with one tile.
+
+Usage:
+from olf_engine import get_overland_flow
+overland_flow = get_overland_flow(model_grid, engine='numba', steep_slopes=True,
+                                  alpha=0.7, mannings_n=0.03, g=9.80665, theta=0.8,
+                                  wet_depth=1e-4, n_tiles=4)
+overland_flow.dt = overland_flow.calc_time_step()
+overland_flow.overland_flow(dt=overland_flow.dt)
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import numpy as np
+from landlab.components import OverlandFlow
+
+from options import ENGINES
+from precision import get_component_info
+
+# link and node flags of the kernels
+ACTIVE_LINK = 1
+OPEN_BOUNDARY_LINK = 2  # active link at an open boundary node
+CORE_NODE = 1
+CLOSED_NODE = 2
+
+# wet state of nodes (bit 0: wet, bit 1: wet at the last sub-step)
+WET = 1
+WAS_WET = 2
+
+_kernels = {}
+
+
+def get_overland_flow(grid, engine='landlab', wet_depth=0.0, n_tiles=1, **kwds):
+    """get the overland flow component of the engine"""
+    if engine not in ENGINES:
+        raise ValueError(f'Unsupported overland flow engine: {engine}')
+
+    if engine == 'numba' and n_tiles > 1:
+        return TiledOverlandFlow(grid, n_tiles=n_tiles, wet_depth=wet_depth, **kwds)
+    if engine == 'numba':
+        return NumbaOverlandFlow(grid, wet_depth=wet_depth, **kwds)
+    if wet_depth > 0:
+        raise ValueError("wet_depth (active set) needs olf_info.engine = 'numba'")
+    if n_tiles > 1:
+        raise ValueError("n_tiles > 1 needs olf_info.engine = 'numba'")
+    return OverlandFlow(grid, **kwds)
+
+
+def get_kernels():
+    """get the kernels compiled with numba (compiled at the first call)"""
+    if not _kernels:
+        try:
+            import numba
+        except ModuleNotFoundError:
+            raise ImportError("olf_info.engine = 'numba' needs the numba package "
+                              "(pip install numba)")
+
+        # numpy error model: division by zero gives inf/nan like OverlandFlow
+        jit = numba.njit(cache=True, nogil=True, error_model='numpy')
+        _kernels['copy'] = jit(copy_discharge)
+        _kernels['discharge'] = jit(update_discharge)
+        _kernels['depth'] = jit(update_depth)
+        _kernels['active_set'] = jit(update_active_set)
+        _kernels['span_nodes'] = jit(get_span_nodes)
+        _kernels['span_links'] = jit(get_span_links)
+        _kernels['max_depth'] = jit(get_max_depth)
+
+    return _kernels
+
+
+def copy_discharge(q, q_old, span_start, span_end, n_rows, n_cols, row_start,
+                   row_end):
+    """
+    copy the discharge of the links of rows row_start to row_end that are read
+    by update_discharge (the spans of the row and the rows next to it and one
+    column more on each side) to q_old.
+    """
+    links_per_row = 2 * n_cols - 1
+    for row in range(row_start, row_end):
+        col_start = n_cols
+        col_end = 0
+        for span_row in range(max(row - 1, 0), min(row + 2, n_rows)):
+            if span_start[span_row] < span_end[span_row]:
+                col_start = min(col_start, span_start[span_row])
+                col_end = max(col_end, span_end[span_row])
+        if col_start >= col_end:
+            continue
+
+        first_link = row * links_per_row
+        last_link = first_link + (links_per_row if row < n_rows - 1 else n_cols - 1)
+        for link in range(max(first_link + col_start - 1, first_link),
+                          min(first_link + col_end, first_link + n_cols - 1)):
+            q_old[link] = q[link]
+        for link in range(max(first_link + n_cols - 1 + col_start - 1, first_link + n_cols - 1),
+                          min(first_link + n_cols - 1 + col_end + 1, last_link)):
+            q_old[link] = q[link]
+
+
+def update_discharge(q, q_old, h_link, slope, h, z, link_flags, mannings_n2,
+                     wet, span_start, span_end, n_rows, n_cols, dx, dy, dt, g,
+                     theta, steep_slopes, row_start, row_end):
+    """
+    update the discharge of the links of rows row_start to row_end (horizontal
+    links of a row and vertical links to the row above) from q_old.
+    mannings_n2 is n**2 of each link or an array of one value. Only the links
+    of the span of active nodes in each row are updated, and links between
+    two dry nodes have no discharge.
+    """
+    links_per_row = 2 * n_cols - 1
+    n_stride = 1 if len(mannings_n2) > 1 else 0
+    inv_dx = 1.0 / dx
+    inv_dy = 1.0 / dy
+    seven_over_three = 7.0 / 3.0
+
+    for row in range(row_start, row_end):
+        col_start = span_start[row]
+        col_end = span_end[row]
+        first_link = row * links_per_row
+        for part in range(2):
+            # horizontal links between the nodes of the span, then vertical
+            # links from the nodes of the span to the row above
+            if part == 0:
+                link_start = first_link + col_start
+                link_end = first_link + col_end - 1
+            elif row < n_rows - 1:
+                link_start = first_link + n_cols - 1 + col_start
+                link_end = first_link + n_cols - 1 + col_end
+            else:
+                break
+
+            for link in range(link_start, link_end):
+                col = link - first_link
+                flags = link_flags[link]
+                if col < n_cols - 1:
+                    tail = row * n_cols + col
+                    head = tail + 1
+                else:
+                    tail = row * n_cols + col - (n_cols - 1)
+                    head = tail + n_cols
+
+                if not (wet[tail] | wet[head]) & WET:
+                    q[link] = 0.0
+                    continue
+
+                # neighbor links with the discharge of the last sub-step. As in
+                # OverlandFlow, horizontal links only have active neighbors and
+                # a missing neighbor of a link at an open boundary is the link
+                q_link = q_old[link]
+                q_1 = 0.0
+                q_2 = 0.0
+                if col < n_cols - 1:
+                    # horizontal link, neighbors to the west and east
+                    inv_length = inv_dx
+                    if col > 0 and link_flags[link - 1] & ACTIVE_LINK:
+                        q_1 = q_old[link - 1]
+                    elif flags & OPEN_BOUNDARY_LINK:
+                        q_1 = q_link
+                    if col < n_cols - 2 and link_flags[link + 1] & ACTIVE_LINK:
+                        q_2 = q_old[link + 1]
+                    elif flags & OPEN_BOUNDARY_LINK:
+                        q_2 = q_link
+                else:
+                    # vertical link, neighbors to the south and north
+                    inv_length = inv_dy
+                    if row > 0:
+                        q_1 = q_old[link - links_per_row]
+                    elif flags & OPEN_BOUNDARY_LINK:
+                        q_1 = q_link
+                    if row < n_rows - 2:
+                        q_2 = q_old[link + links_per_row]
+                    elif flags & OPEN_BOUNDARY_LINK:
+                        q_2 = q_link
+
+                # water depth and water surface slope at active links
+                if flags & ACTIVE_LINK:
+                    w_tail = h[tail] + z[tail]
+                    w_head = h[head] + z[head]
+                    h_link[link] = max(w_tail, w_head) - max(z[tail], z[head])
+                    slope[link] = (w_head - w_tail) * inv_length
+
+                # friction term (the power is skipped for links without discharge)
+                h_l = h_link[link]
+                friction = 1.0
+                if q_link != 0.0:
+                    friction = 1 + g * dt * mannings_n2[link * n_stride] * abs(q_link) \
+                        / h_l ** seven_over_three
+                q_new = (theta * q_link + (1.0 - theta) / 2.0 * (q_1 + q_2)
+                         - g * h_l * dt * slope[link]) / friction
+
+                if steep_slopes:
+                    # limits of the Froude number and the Courant number
+                    froude = (q_new / h_l) / np.sqrt(g * h_l)
+                    courant = q_new * dt / dx
+                    if q_new > 0:
+                        if courant > h_l / 4.0:
+                            q_new = h_l * dx / 5.0 / dt
+                        elif froude > 1.0:
+                            q_new = h_l * np.sqrt(g * h_l)
+                    elif q_new < 0:
+                        if abs(courant) > h_l / 4.0:
+                            q_new = 0.0 - h_l * dx / 5.0 / dt
+                        elif abs(froude) > 1.0:
+                            q_new = 0.0 - h_l * np.sqrt(g * h_l)
+
+                q[link] = q_new
+
+
+def update_depth(h, q, rain, node_flags, wet, span_start, span_end, n_rows,
+                 n_cols, dx, dy, dt, h_init, wet_depth, steep_slopes,
+                 row_start, row_end):
+    """
+    update the water depth of the nodes of rows row_start to row_end from the
+    rain and the flux divergence. rain is the rain rate of each node or an
+    array of one value. Only the span of active nodes in each row is updated,
+    and the wet state of the nodes is updated if wet_depth > 0.
+    """
+    links_per_row = 2 * n_cols - 1
+    rain_stride = 1 if len(rain) > 1 else 0
+    area_of_cell = dx * dy
+    min_depth = h_init * 10.0 ** -3
+
+    for row in range(row_start, row_end):
+        for col in range(span_start[row], span_end[row]):
+            node = row * n_cols + col
+            if node_flags[node] & CORE_NODE:
+                if 0 < row < n_rows - 1 and 0 < col < n_cols - 1:
+                    # net outflux through the faces of the cell (east, north,
+                    # west and south, same order as grid.calc_flux_div_at_node)
+                    link = row * links_per_row + col - 1  # link to the west
+                    flux_div = (q[link + 1] * dy + q[link + n_cols] * dx
+                                - q[link] * dy - q[link - n_cols + 1] * dx) \
+                        / area_of_cell
+                else:
+                    flux_div = 0.0
+                h[node] = h[node] + (rain[node * rain_stride] - flux_div) * dt
+
+            if steep_slopes and h[node] < h_init:
+                h[node] = min_depth
+
+            if wet_depth > 0:
+                is_wet = not node_flags[node] & CLOSED_NODE and \
+                    (h[node] > wet_depth or rain[node * rain_stride] > 0)
+                wet[node] = (wet[node] & WET) * WAS_WET + (WET if is_wet else 0)
+
+
+def update_active_set(wet, q, span_start, span_end, new_start, new_end,
+                      n_rows, n_cols, row_start, row_end):
+    """
+    get the spans of active nodes (wet nodes and their neighbors) of rows
+    row_start to row_end after update_depth. The discharge of the links of
+    nodes that became dry is set to zero if the other node is dry.
+    """
+    links_per_row = 2 * n_cols - 1
+    for row in range(row_start, row_end):
+        # wet nodes are in the spans of the last sub-step, so new active nodes
+        # are in the spans of the row and the rows next to it (one more column)
+        col_start = n_cols
+        col_end = 0
+        for span_row in range(max(row - 1, 0), min(row + 2, n_rows)):
+            if span_start[span_row] < span_end[span_row]:
+                col_start = min(col_start, span_start[span_row])
+                col_end = max(col_end, span_end[span_row])
+
+        new_col_start = n_cols
+        new_col_end = 0
+        for col in range(max(col_start - 1, 0), min(col_end + 1, n_cols)):
+            node = row * n_cols + col
+            if (wet[node]
+                    | (wet[node - 1] if col > 0 else 0)
+                    | (wet[node + 1] if col < n_cols - 1 else 0)
+                    | (wet[node - n_cols] if row > 0 else 0)
+                    | (wet[node + n_cols] if row < n_rows - 1 else 0)) & WET:
+                new_col_start = min(new_col_start, col)
+                new_col_end = col + 1
+
+            if wet[node] == WAS_WET:
+                # links to the east, north, west and south
+                link = row * links_per_row + col
+                if col < n_cols - 1 and not wet[node + 1] & WET:
+                    q[link] = 0.0
+                if row < n_rows - 1 and not wet[node + n_cols] & WET:
+                    q[link + n_cols - 1] = 0.0
+                if col > 0 and not wet[node - 1] & WET:
+                    q[link - 1] = 0.0
+                if row > 0 and not wet[node - n_cols] & WET:
+                    q[link - n_cols] = 0.0
+                wet[node] = 0
+
+        if new_col_start < new_col_end:
+            new_start[row] = new_col_start
+            new_end[row] = new_col_end
+        else:
+            new_start[row] = 0
+            new_end[row] = 0
+
+
+def get_span_nodes(span_start, span_end, n_cols):
+    """get the ids of the nodes in the spans"""
+    nodes = np.empty((span_end - span_start).sum(), dtype=np.int64)
+    index = 0
+    for row in range(len(span_start)):
+        for col in range(span_start[row], span_end[row]):
+            nodes[index] = row * n_cols + col
+            index += 1
+
+    return nodes
+
+
+def get_span_links(span_start, span_end, n_cols):
+    """get the ids of the links of the nodes in the spans (as update_discharge)"""
+    n_rows = len(span_start)
+    links_per_row = 2 * n_cols - 1
+    links = np.empty(2 * (span_end - span_start).sum(), dtype=np.int64)
+    index = 0
+    for row in range(n_rows):
+        first_link = row * links_per_row
+        for col in range(span_start[row], span_end[row] - 1):
+            links[index] = first_link + col
+            index += 1
+        if row < n_rows - 1:
+            for col in range(span_start[row], span_end[row]):
+                links[index] = first_link + n_cols - 1 + col
+                index += 1
+
+    return links[:index]
+
+
+def get_max_depth(h, n_cols, row_start, row_end):
+    """get the max water depth of the nodes of rows row_start to row_end"""
+    return np.max(h[row_start * n_cols:row_end * n_cols])
+
+
+class NumbaOverlandFlow(OverlandFlow):
+    def __init__(self, grid, wet_depth=0.0, **kwds):
+        """
+        grid: raster model grid
+        wet_depth: max water depth (m) of dry nodes, 0 to update all nodes
+        kwds: settings of OverlandFlow (default_fixed_links is not supported)
+        """
+        # fields can be float32 (model_run.precision)
+        self._info = get_component_info(OverlandFlow._info, grid)
+        super().__init__(grid, **kwds)
+        if self._default_fixed_links:
+            raise ValueError('default_fixed_links is not supported by the numba engine')
+
+        self._kernels = get_kernels()
+        self._wet_depth = wet_depth
+
+        link_flags = np.zeros(grid.number_of_links, dtype=np.uint8)
+        link_flags[grid.active_links] = ACTIVE_LINK
+        open_boundary = np.zeros(grid.number_of_nodes, dtype=bool)
+        open_boundary[grid.open_boundary_nodes] = True
+        at_open_boundary = open_boundary[grid.node_at_link_tail] | \
+            open_boundary[grid.node_at_link_head]
+        link_flags[(link_flags == ACTIVE_LINK) & at_open_boundary] |= OPEN_BOUNDARY_LINK
+        self._link_flags = link_flags
+
+        self._node_flags = np.zeros(grid.number_of_nodes, dtype=np.uint8)
+        self._node_flags[grid.core_nodes] = CORE_NODE
+        self._node_flags[grid.status_at_node == grid.BC_NODE_IS_CLOSED] = CLOSED_NODE
+
+        # manning's n squared (one value or each link)
+        self._mannings_n2 = np.atleast_1d(
+            np.asarray(self._mannings_n, dtype=float) ** 2.0)
+
+        self._q_old = np.zeros_like(grid.at_link["surface_water__discharge"])
+        self._rain = None
+        self._rain_values = None
+
+        # active set: wet state of nodes and the span of active nodes of
+        # each row (all nodes are wet without the active set)
+        n_rows, n_cols = grid.shape
+        self._wet = np.full(grid.number_of_nodes, WET, dtype=np.uint8)
+        self._span_start = np.zeros(n_rows, dtype=np.int64)
+        self._span_end = np.full(n_rows, n_cols, dtype=np.int64)
+        self._new_span_start = np.zeros(n_rows, dtype=np.int64)
+        self._new_span_end = np.zeros(n_rows, dtype=np.int64)
+        self._reset_active_set = wet_depth > 0
+        self._active_nodes = None
+        self._active_links = None
+
+    @property
+    def active_set(self):
+        """only the active set is updated"""
+        return self._wet_depth > 0
+
+    def get_rain_values(self):
+        """get the rain rate as an array for the kernels"""
+        if self._rainfall_intensity is not self._rain:
+            self._rain = self._rainfall_intensity
+            self._rain_values = np.ascontiguousarray(
+                np.atleast_1d(self._rainfall_intensity), dtype=float)
+            self._reset_active_set = self.active_set
+
+        return self._rain_values
+
+    def reset_active_set(self):
+        """
+        get the wet nodes and the spans of active nodes from the water depth
+        and the rain (at the start and when the rain changes)
+        """
+        n_rows, n_cols = self._grid.shape
+        rain = np.broadcast_to(self._rain_values, self._h.shape)
+        wet = ((self._h > self._wet_depth) | (rain > 0)) & \
+            (self._node_flags != CLOSED_NODE)
+        self._wet[:] = np.where(wet, WET, 0)
+
+        # links between dry nodes have no discharge
+        dry_links = ~(wet[self._grid.node_at_link_tail] | wet[self._grid.node_at_link_head])
+        self._q[dry_links] = 0.0
+
+        # active nodes are the wet nodes and their neighbors
+        wet = wet.reshape(n_rows, n_cols)
+        active = wet.copy()
+        active[1:] |= wet[:-1]
+        active[:-1] |= wet[1:]
+        active[:, 1:] |= wet[:, :-1]
+        active[:, :-1] |= wet[:, 1:]
+        has_active = active.any(axis=1)
+        self._span_start[:] = np.where(has_active, active.argmax(axis=1), 0)
+        self._span_end[:] = np.where(has_active,
+                                     n_cols - active[:, ::-1].argmax(axis=1), 0)
+        self._reset_active_set = False
+
+    def get_active_nodes(self):
+        """get the ids of the nodes in the spans of active nodes (None for all nodes)"""
+        if not self.active_set:
+            return None
+        if self._active_nodes is None:
+            self._active_nodes = self._kernels['span_nodes'](
+                self._span_start, self._span_end, self._grid.shape[1])
+
+        return self._active_nodes
+
+    def get_active_links(self):
+        """get the ids of the links of the active nodes (None for all links)"""
+        if not self.active_set:
+            return None
+        if self._active_links is None:
+            self._active_links = self._kernels['span_links'](
+                self._span_start, self._span_end, self._grid.shape[1])
+
+        return self._active_links
+
+    def run_rows(self, dt, row_start, row_end, phase):
+        """
+        run a phase of a sub-step ('copy', 'discharge', 'depth' or
+        'active_set') on a range of rows
+        """
+        n_rows, n_cols = self._grid.shape
+        if phase == 'copy':
+            self._kernels['copy'](
+                self._q, self._q_old, self._span_start, self._span_end,
+                n_rows, n_cols, row_start, row_end)
+        elif phase == 'discharge':
+            self._kernels['discharge'](
+                self._q, self._q_old, self._h_links, self._water_surface_slope,
+                self._h, self._z, self._link_flags, self._mannings_n2, self._wet,
+                self._span_start, self._span_end, n_rows, n_cols, self._grid.dx,
+                self._grid.dy, dt, self._g, self._theta, self._steep_slopes,
+                row_start, row_end)
+        elif phase == 'depth':
+            self._kernels['depth'](
+                self._h, self._q, self._rain_values, self._node_flags, self._wet,
+                self._span_start, self._span_end, n_rows, n_cols, self._grid.dx,
+                self._grid.dy, dt, self._h_init, self._wet_depth,
+                self._steep_slopes, row_start, row_end)
+        else:
+            self._kernels['active_set'](
+                self._wet, self._q, self._span_start, self._span_end,
+                self._new_span_start, self._new_span_end, n_rows, n_cols,
+                row_start, row_end)
+
+    def swap_spans(self):
+        """use the spans of the active set after a sub-step"""
+        self._span_start, self._new_span_start = self._new_span_start, self._span_start
+        self._span_end, self._new_span_end = self._new_span_end, self._span_end
+        self._active_nodes = None
+        self._active_links = None
+
+    def overland_flow(self, dt=None):
+        """run overland flow for dt (same sub-steps as OverlandFlow.overland_flow)"""
+        local_elapsed_time = 0.0
+        if dt is None:
+            dt = np.inf  # to allow the loop to begin
+        while local_elapsed_time < dt:
+            dt_local = self.calc_time_step()
+            if not dt_local < np.inf:
+                break
+            if local_elapsed_time + dt_local > dt:
+                dt_local = dt - local_elapsed_time
+            self._dt = dt_local
+
+            # fields may be replaced by other components
+            self._h = self._grid.at_node["surface_water__depth"]
+            self._z = self._grid.at_node["topographic__elevation"]
+            self._q = self._grid.at_link["surface_water__discharge"]
+            self._h_links = self._grid.at_link["surface_water__depth"]
+            self._water_surface_slope = self._grid.at_link["water_surface__gradient"]
+            self.get_rain_values()
+            if self._reset_active_set:
+                self.reset_active_set()
+
+            # discharge of the links from the discharge of the last sub-step,
+            # then the water depth from the new discharge
+            n_rows = self._grid.shape[0]
+            if self.active_set:
+                self.run_rows(self._dt, 0, n_rows, 'copy')
+            else:
+                np.copyto(self._q_old, self._q)
+            self.run_rows(self._dt, 0, n_rows, 'discharge')
+            self.run_rows(self._dt, 0, n_rows, 'depth')
+            if self.active_set:
+                self.run_rows(self._dt, 0, n_rows, 'active_set')
+                self.swap_spans()
+
+            if dt is np.inf:
+                break
+            local_elapsed_time += self._dt
+
+
+class TiledOverlandFlow(NumbaOverlandFlow):
+    def __init__(self, grid, n_tiles=2, wet_depth=0.0, **kwds):
+        """
+        grid: raster model grid
+        n_tiles: number of strips of rows updated in parallel threads
+        wet_depth: max water depth (m) of dry nodes, 0 to update all nodes
+        kwds: settings of OverlandFlow (default_fixed_links is not supported)
+        """
+        super().__init__(grid, wet_depth=wet_depth, **kwds)
+
+        n_rows = grid.shape[0]
+        if not 1 <= n_tiles <= n_rows:
+            raise ValueError(f'Unsupported number of tiles: {n_tiles} '
+                             f'(1 to {n_rows} rows)')
+
+        # first row of each tile (and the end of the last tile)
+        self._tile_rows = np.linspace(0, n_rows, n_tiles + 1).round().astype(int)
+        self._n_tiles = n_tiles
+        self._tile_dt = np.zeros(n_tiles)
+        self._barrier = threading.Barrier(n_tiles)
+        self._executor = ThreadPoolExecutor(max_workers=n_tiles,
+                                            thread_name_prefix='olf_tile')
+
+    @property
+    def n_tiles(self):
+        """number of tiles updated in parallel"""
+        return self._n_tiles
+
+    def get_tile_time_step(self, tile):
+        """get the time step (s) of the max water depth of a tile (as calc_time_step)"""
+        max_depth = self._kernels['max_depth'](
+            self._h, self._grid.shape[1], self._tile_rows[tile], self._tile_rows[tile + 1])
+        with np.errstate(divide='ignore'):
+            return self._alpha * self._grid.dx / np.sqrt(self._g * max_depth)
+
+    def run_tile(self, tile, dt):
+        """
+        run the sub-steps of overland_flow(dt) on a tile, returns the time
+        step of the last sub-step (None without sub-steps)
+        """
+        row_start, row_end = self._tile_rows[tile], self._tile_rows[tile + 1]
+        barrier = self._barrier
+
+        self._tile_dt[tile] = self.get_tile_time_step(tile)
+        barrier.wait()
+
+        dt_local = None
+        local_elapsed_time = 0.0
+        while local_elapsed_time < dt:
+            # min-reduction of the time steps of the tiles
+            dt_local = self._tile_dt.min()
+            if not dt_local < np.inf:
+                break
+            if local_elapsed_time + dt_local > dt:
+                dt_local = dt - local_elapsed_time
+
+            # the phases read the halo rows of the tiles next to it, so each
+            # phase starts when all tiles have finished the last phase
+            self.run_rows(dt_local, row_start, row_end, 'copy')
+            barrier.wait()
+            self.run_rows(dt_local, row_start, row_end, 'discharge')
+            barrier.wait()
+            self.run_rows(dt_local, row_start, row_end, 'depth')
+            self._tile_dt[tile] = self.get_tile_time_step(tile)
+            barrier.wait()
+            if self.active_set:
+                self.run_rows(dt_local, row_start, row_end, 'active_set')
+                barrier.wait()
+                self._span_start[row_start:row_end] = self._new_span_start[row_start:row_end]
+                self._span_end[row_start:row_end] = self._new_span_end[row_start:row_end]
+                barrier.wait()
+
+            if dt is np.inf:
+                break
+            local_elapsed_time += dt_local
+
+        return dt_local
+
+    def run_tile_safe(self, tile, dt):
+        """run_tile, the other tiles stop waiting if a tile fails"""
+        try:
+            return self.run_tile(tile, dt)
+        except BaseException:
+            self._barrier.abort()
+            raise
+
+    def overland_flow(self, dt=None):
+        """run overland flow for dt on the tiles (same sub-steps as NumbaOverlandFlow)"""
+        if dt is None:
+            dt = np.inf  # to allow the loop to begin
+
+        # fields may be replaced by other components
+        self._h = self._grid.at_node["surface_water__depth"]
+        self._z = self._grid.at_node["topographic__elevation"]
+        self._q = self._grid.at_link["surface_water__discharge"]
+        self._h_links = self._grid.at_link["surface_water__depth"]
+        self._water_surface_slope = self._grid.at_link["water_surface__gradient"]
+        self.get_rain_values()
+        if self._reset_active_set:
+            self.reset_active_set()
+
+        self._barrier.reset()
+        futures = [self._executor.submit(self.run_tile_safe, tile, dt)
+                   for tile in range(self._n_tiles)]
+        errors = [future.exception() for future in futures]
+        self._active_nodes = None
+        self._active_links = None
+
+        # error of the failed tile (the other tiles get BrokenBarrierError)
+        errors = [error for error in errors if error is not None]
+        for error in errors:
+            if not isinstance(error, threading.BrokenBarrierError):
+                raise error
+        if errors:
+            raise errors[0]
+
+        dt_local = futures[0].result()
+        if dt_local is not None:
+            self._dt = dt_local
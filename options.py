@@ -0,0 +1,31 @@
+"""
+Supported options of the configuration file
+
+The names of the options are kept in this module without dependencies, so
+the modules of the model and the validation of cli.py (which does not
+import Landlab) use the same lists.
+
+Usage:
+from options import ENGINES
+if engine not in ENGINES:
+    raise ValueError(f'Unsupported overland flow engine: {engine}')
+
+"""
+
+# olf_info.engine
+ENGINES = ['landlab', 'numba']
+
+# model_run.precision
+PRECISIONS = ['float64', 'float32']
+
+# olf_info.rain_interpolation
+RAIN_INTERPOLATIONS = ['hold', 'linear']
+
+# olf_info.hyetograph (SCS design storms, besides a list of relative intensities)
+HYETOGRAPHS = ['scs_type_i', 'scs_type_ia', 'scs_type_ii', 'scs_type_iii']
+
+# output.flood_metrics
+FLOOD_METRICS = ['max_depth_time', 'inundation_duration', 'mean_depth', 'flow_volume']
+
+# resample methods of the hydrograph analysis
+RESAMPLE_METHODS = ['first', 'mean', 'max']
@@ -1,13 +1,19 @@
 """
 keep track of testing code
+set engine = 'numba' to validate the numba overland flow engine (olf_engine.py)
 """
+import os
+import sys
+
 from landlab.io import read_esri_ascii
 from landlab import imshow_grid
-from landlab.components import OverlandFlow
 
 import matplotlib.pyplot as plt
 import pandas as pd
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from olf_engine import get_overland_flow
+
 # load dem data
 grid_file = './paper_use_case/flat_domain.asc'
 model_grid, dem_data = read_esri_ascii(grid_file, name='topographic__elevation')
@@ -29,17 +35,19 @@ u = 0.4  # constant velocity at boundary m/s
 alpha = 0.7
 theta = 1  # [0.8, 0.9, 1]
 steep_slopes = False
+engine = 'landlab'  # 'landlab' or 'numba'
 
 model_run_time = 9000  # sec
 elapsed_time = 0.0
 
 # instantiate overland flow component
-overland_flow = OverlandFlow(model_grid,
-                             steep_slopes=steep_slopes,
-                             alpha=alpha,
-                             mannings_n=mannings_n,
-                             theta=theta,
-                             )
+overland_flow = get_overland_flow(model_grid,
+                                  engine=engine,
+                                  steep_slopes=steep_slopes,
+                                  alpha=alpha,
+                                  mannings_n=mannings_n,
+                                  theta=theta,
+                                  )
 
 
 # run model
@@ -0,0 +1,131 @@
+"""
+Plot functions for model results
+
+The plots can be made in the model loop or in background processes. For the
+background plots, the data (water depth, infiltration depth, outlet
+discharge) is copied when a plot is submitted, so the model run continues
+while the png files are made. The outlet discharge is the bounded series of
+HydrographRecorder.get_plot_series(), not the full record. The background
+processes are started with 'spawn' (not fork), because the model has running
+threads (rain prefetch, numba tiles) when the processes start.
+
+Usage:
+from plotting import PlotRenderer, plot_flow
+renderer = PlotRenderer(model_grid, workers=2, queue_size=4)
+renderer.submit(plot_flow, 'flow_120.png', 120, depth, hydrograph.get_plot_series())
+renderer.close()
+
+"""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib.pyplot as plt
+from landlab import imshow_grid, RasterModelGrid
+
+# model grid used in each background process
+_grid = None
+
+
+def plot_flow(grid, file_path, time_slice, water_depth, outlet_result):
+    """plot outlet discharge and surface water depth"""
+    fig, ax = plt.subplots(
+        2, 1, figsize=(8, 9), gridspec_kw={"height_ratios": [1, 1.5]}
+    )
+    fig.suptitle("Results at {} min".format(time_slice / 60))
+
+    ax[0].plot(outlet_result[:, 0], outlet_result[:, 1], "-")
+    ax[0].set_xlabel("Time elapsed (s)")
+    ax[0].set_ylabel("discharge (cms)")
+    ax[0].set_title("Water discharge at the outlet")
+
+    imshow_grid(
+        grid,
+        water_depth,
+        cmap="Blues",
+        var_name="surface water depth (m)",
+    )
+    ax[1].set_title("")
+    ax[1].set_xlabel('east-west distance (m)')
+    ax[1].set_ylabel('north-south distance (m)')
+
+    plt.close(fig)
+    fig.savefig(file_path)
+
+
+def plot_infiltration(grid, file_path, infiltration_depth):
+    """plot soil water infiltration depth"""
+    fig, ax = plt.subplots(figsize=(8, 9))
+    imshow_grid(
+        grid,
+        infiltration_depth,
+        cmap="Blues",
+        var_name=" soil water infiltration depth (m)",
+    )
+    ax.set_title("")
+    ax.set_xlabel('east-west distance (m)')
+    ax.set_ylabel('north-south distance (m)')
+
+    plt.close(fig)
+    fig.savefig(file_path)
+
+
+def _init_worker(shape, xy_spacing, xy_of_lower_left, status_at_node):
+    """create the model grid in a background process"""
+    global _grid
+
+    plt.switch_backend('Agg')
+    _grid = RasterModelGrid(shape, xy_spacing=xy_spacing,
+                            xy_of_lower_left=xy_of_lower_left)
+    _grid.status_at_node = status_at_node
+
+
+def _render(plot_func, *args):
+    plot_func(_grid, *args)
+
+
+class PlotRenderer:
+    def __init__(self, grid, workers=0, queue_size=4):
+        """
+        grid: RasterModelGrid of the model
+        workers: number of background processes, 0 to plot in the model loop
+        queue_size: max number of plots waiting in the background processes
+        """
+
+        self.grid = grid
+        self.queue_size = max(queue_size, 1)
+        self._pending = deque()
+        self._executor = None
+
+        if workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(grid.shape, (grid.dx, grid.dy), grid.xy_of_lower_left,
+                          np.array(grid.status_at_node)))
+
+    def submit(self, plot_func, *args):
+        """
+        make a plot with plot_func(grid, *args). The args arrays should not be
+        changed by the model after the submit (pass a copy).
+        """
+
+        if self._executor is None:
+            plot_func(self.grid, *args)
+        else:
+            # wait for old plots if the queue is full
+            while len(self._pending) >= self.queue_size:
+                self._pending.popleft().result()
+            self._pending.append(self._executor.submit(_render, plot_func, *args))
+
+    def close(self):
+        """wait for all plots to finish"""
+        while self._pending:
+            self._pending.popleft().result()
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,50 @@
+"""
+Precision of the model fields
+
+model_run.precision sets the data type of the model state (surface water
+depth, discharge and infiltration depth), the forcing (rain rate and hydraulic
+conductivity arrays) and the max fields. 'float32' halves the memory of these
+arrays and the data moved in the model loop. The elevation, the water budget
+and the sums of the flood metrics stay float64.
+
+Landlab components check that their input fields are float64, so the
+overland flow and infiltration components of the model take the data types
+of their field info from the grid fields (get_component_info).
+float32 needs the numba overland flow engine (OverlandFlow of Landlab
+replaces the discharge field with a float64 array at each sub-step).
+
+Usage:
+from precision import get_dtype
+dtype = get_dtype('float32')
+model_grid.add_zeros('surface_water__depth', at='node', dtype=dtype)
+
+"""
+
+import numpy as np
+
+from options import PRECISIONS
+
+DTYPES = {'float64': np.float64, 'float32': np.float32}
+
+
+def get_dtype(precision):
+    """get the data type of the model fields of a precision"""
+    if precision not in PRECISIONS:
+        raise ValueError(f'Unsupported precision: {precision}')
+
+    return DTYPES[precision]
+
+
+def get_component_info(info, grid):
+    """
+    get the field info of a Landlab component with the data types of the
+    float fields of the grid (e.g. float32 water depth)
+    """
+    component_info = {}
+    for name, field_info in info.items():
+        fields = grid[field_info['mapping']]
+        if name in fields and np.issubdtype(fields[name].dtype, np.floating):
+            field_info = dict(field_info, dtype=fields[name].dtype)
+        component_info[name] = field_info
+
+    return component_info
@@ -0,0 +1,194 @@
+"""
+Timing of the model run phases
+
+PhaseTimer records the wall time and number of calls of each phase of
+FloodSimulator.run() (time step, overland flow, infiltration, discharge,
+plotting, output, ...) and the model sub-steps in each time slice (number of
+sub-steps, min, mean and max dt). The timer is disabled by default, and a disabled
+timer does nothing, so it can stay in the model loop.
+
+The timer is enabled by output.profile = true in the configuration file or the
+FLOOD_SIMULATOR_PROFILE environment variable (e.g. FLOOD_SIMULATOR_PROFILE=1).
+The report is saved as timing_report.json (phases) and timing_intervals.csv
+(sub-steps of each time slice) in the output folder.
+
+For more details, profile_mode = 'cprofile' (or FLOOD_SIMULATOR_PROFILE=cprofile)
+saves run_profile.prof for pstats/snakeviz, and profile_mode = 'pyinstrument'
+saves run_profile.html (needs pyinstrument).
+
+Usage:
+from profiling import PhaseTimer
+timer = PhaseTimer()
+timer.start()
+...
+timer.lap('overland_flow')  # time since the last lap is added to the phase
+timer.add_step(dt)
+timer.end_interval(time_slice)
+timer.save(output_folder)
+
+"""
+
+import os
+import json
+import time
+import cProfile
+from collections import defaultdict
+
+
+PROFILE_ENV = 'FLOOD_SIMULATOR_PROFILE'
+PROFILE_MODES = ['', 'cprofile', 'pyinstrument']
+
+
+def get_profile_settings(output):
+    """get (enabled, profile_mode) from the output setting and the environment"""
+    enabled = output.get('profile', False)
+    profile_mode = output.get('profile_mode', '')
+
+    env_value = os.environ.get(PROFILE_ENV, '').strip().lower()
+    if env_value in PROFILE_MODES[1:]:
+        enabled = True
+        profile_mode = env_value
+    elif env_value not in ['', '0', 'false']:
+        enabled = True
+
+    if profile_mode not in PROFILE_MODES:
+        raise ValueError(f'Unsupported profile mode: {profile_mode}')
+
+    return enabled, profile_mode
+
+
+class PhaseTimer:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.intervals = []
+
+        self._last = None
+        self._interval_start = None
+        self._n_steps = 0
+        self._dt_sum = 0.0
+        self._dt_min = float('inf')
+        self._dt_max = 0.0
+
+    def start(self):
+        """start timing of the phases and the first reporting interval"""
+        if not self.enabled:
+            return
+
+        self._last = time.perf_counter()
+        self._interval_start = self._last
+
+    def lap(self, phase):
+        """add the time since the last lap (or start) to the phase"""
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        self.totals[phase] += now - self._last
+        self.counts[phase] += 1
+        self._last = now
+
+    def add_step(self, dt):
+        """record a model sub-step"""
+        if not self.enabled:
+            return
+
+        self._n_steps += 1
+        self._dt_sum += dt
+        self._dt_min = min(self._dt_min, dt)
+        self._dt_max = max(self._dt_max, dt)
+
+    def end_interval(self, model_time):
+        """record the sub-steps of the reporting interval ending at model_time (s)"""
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        self.intervals.append({
+            'time': model_time,
+            'steps': self._n_steps,
+            'min_dt': self._dt_min if self._n_steps else float('nan'),
+            'mean_dt': self._dt_sum / self._n_steps if self._n_steps else float('nan'),
+            'max_dt': self._dt_max if self._n_steps else float('nan'),
+            'wall_time': now - self._interval_start,
+        })
+
+        self._interval_start = now
+        self._n_steps = 0
+        self._dt_sum = 0.0
+        self._dt_min = float('inf')
+        self._dt_max = 0.0
+
+    def get_report(self):
+        """get the timing of the phases and the sub-step summary"""
+        import pandas as pd
+
+        total = sum(self.totals.values())
+        phases = {
+            phase: {
+                'time': self.totals[phase],
+                'calls': self.counts[phase],
+                'mean_time': self.totals[phase] / self.counts[phase],
+                'fraction': self.totals[phase] / total if total else 0.0,
+            }
+            for phase in sorted(self.totals, key=self.totals.get, reverse=True)
+        }
+
+        intervals = pd.DataFrame(self.intervals, columns=[
+            'time', 'steps', 'min_dt', 'mean_dt', 'max_dt', 'wall_time'])
+        n_steps = int(intervals['steps'].sum())
+        loop_time = intervals['wall_time'].sum()
+
+        return {
+            'total_time': total,
+            'phases': phases,
+            'steps': n_steps,
+            'steps_per_second': n_steps / loop_time if loop_time else 0.0,
+            'min_dt': intervals['min_dt'].min() if n_steps else None,
+            'mean_dt': intervals['mean_dt'].mul(intervals['steps']).sum() / n_steps
+            if n_steps else None,
+            'max_dt': intervals['max_dt'].max() if n_steps else None,
+        }
+
+    def save(self, output_folder):
+        """save timing_report.json and timing_intervals.csv"""
+        if not self.enabled:
+            return
+
+        with open(os.path.join(output_folder, 'timing_report.json'), 'w') as fp:
+            json.dump(self.get_report(), fp, indent=2)
+
+        import pandas as pd
+
+        pd.DataFrame(self.intervals, columns=[
+            'time', 'steps', 'min_dt', 'mean_dt', 'max_dt', 'wall_time']).to_csv(
+            os.path.join(output_folder, 'timing_intervals.csv'), index=False)
+
+
+def run_profiler(function, profile_mode, output_folder):
+    """run the function with cProfile or pyinstrument and save the profile"""
+    if profile_mode == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function)
+        finally:
+            profiler.dump_stats(os.path.join(output_folder, 'run_profile.prof'))
+
+    if profile_mode == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ModuleNotFoundError:
+            raise ImportError("profile_mode = 'pyinstrument' needs the pyinstrument "
+                              "package (pip install pyinstrument)")
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            return function()
+        finally:
+            profiler.stop()
+            with open(os.path.join(output_folder, 'run_profile.html'), 'w') as fp:
+                fp.write(profiler.output_html())
+
+    return function()
@@ -0,0 +1,139 @@
+"""
+Read raster files (GeoTIFF, cloud-optimized GeoTIFF) as model grid inputs
+
+Raster files store rows from north to south, while the landlab node order
+starts from the lower left corner. read_raster() flips the rows so that the
+returned 1D array can be used as a node field.
+
+read_grid_values() reads model inputs (rain, conductivity, initial water
+depth, ...) on the grid of the terrain. The raster should cover the terrain
+extent, and it is resampled when its resolution differs from the DEM. The
+decoded arrays are cached, so the same file is only read once per process.
+rasterio is imported when a raster is read, so a model run of esri ascii
+files does not load GDAL.
+
+Usage:
+from raster_io import read_raster, read_grid_values
+data, info = read_raster('geer_canyon.tif', window=[0, 0, 100, 80])
+rain = read_grid_values('rain_input_large.tif', shape=(158, 223), fill_value=0.0)
+
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+
+
+RASTER_SUFFIXES = ('.tif', '.tiff')
+
+
+def is_raster_file(file_path):
+    """check if the file is a GeoTIFF file"""
+    return os.path.splitext(file_path)[1].lower() in RASTER_SUFFIXES
+
+
+def read_raster(file_path, band=1, window=None, decimation=1):
+    """
+    read a raster band as a 1D array in landlab node order.
+
+    file_path: path or url of the raster file
+    band: band index (starts from 1)
+    window: [col_off, row_off, width, height] of a subregion (north-up file
+            rows and columns), None to read the whole raster
+    decimation: read at 1/decimation resolution (overviews are used if the
+                file has them)
+
+    returns (data, info). info is a dict with shape, xy_spacing,
+    xy_of_lower_left, nodata and is_geographic.
+    """
+    import rasterio
+    from rasterio.windows import Window
+
+    with rasterio.open(file_path) as src:
+        if window:
+            window = Window(*window)
+        else:
+            window = Window(0, 0, src.width, src.height)
+
+        out_shape = (int(np.ceil(window.height / decimation)),
+                     int(np.ceil(window.width / decimation)))
+        data = src.read(band, window=window, out_shape=out_shape)
+
+        transform = src.window_transform(window)
+        dx = abs(transform.a) * window.width / out_shape[1]
+        dy = abs(transform.e) * window.height / out_shape[0]
+
+        info = {
+            'shape': out_shape,
+            'xy_spacing': (dx, dy),
+            'xy_of_lower_left': (transform.c, transform.f - window.height * abs(transform.e)),
+            'nodata': src.nodata,
+            'is_geographic': src.crs is not None and src.crs.is_geographic,
+            'decimation': window.width / out_shape[1],
+        }
+
+    # flip rows from north-up to landlab order (south-up)
+    return np.flipud(data).flatten(), info
+
+
+def read_grid_values(file_path, shape=None, band=1, resampling='nearest',
+                     fill_value=np.nan, cache=True):
+    """
+    read a raster band as node values of a grid (landlab node order).
+
+    file_path: path of the raster file (any format supported by GDAL,
+               e.g. GeoTIFF or esri ascii)
+    shape: (nrows, ncols) of the grid, the raster is resampled to the shape
+           if it has a different resolution. None to use the raster shape
+    band: band index (starts from 1)
+    resampling: rasterio resampling method (e.g. 'nearest', 'bilinear')
+    fill_value: value of the nodata cells
+    cache: keep the decoded array to reuse it for the same file and settings
+
+    returns a read-only array if cache is True.
+    """
+    from rasterio.enums import Resampling
+
+    if resampling not in Resampling.__members__:
+        raise ValueError(f'Unsupported resampling method: {resampling}')
+
+    if not cache:
+        return _read_grid_values(file_path, shape, band, resampling, fill_value)
+
+    stat = os.stat(file_path)
+    return _read_cached_grid_values(os.path.abspath(file_path), stat.st_mtime_ns,
+                                    stat.st_size,
+                                    None if shape is None else tuple(shape),
+                                    band, resampling, fill_value)
+
+
+@lru_cache(maxsize=32)
+def _read_cached_grid_values(file_path, mtime, size, shape, band, resampling,
+                             fill_value):
+    data = _read_grid_values(file_path, shape, band, resampling, fill_value)
+    data.flags.writeable = False
+    return data
+
+
+def _read_grid_values(file_path, shape, band, resampling, fill_value):
+    import rasterio
+    from rasterio.enums import Resampling
+
+    with rasterio.open(file_path) as src:
+        if shape is None:
+            shape = src.shape
+        elif tuple(src.shape) != tuple(shape):
+            # the raster and the grid should have the same extent
+            if not np.isclose(src.height / src.width, shape[0] / shape[1], rtol=0.01):
+                raise ValueError(f'{file_path} has shape {src.shape}, which does '
+                                 f'not match the extent of the grid {tuple(shape)}.')
+
+        data = src.read(band, out_shape=tuple(shape), masked=True,
+                        resampling=Resampling[resampling])
+
+    data = data.astype(float).filled(np.nan)
+    data[np.isnan(data)] = fill_value
+
+    # flip rows from north-up to landlab order (south-up)
+    return np.flipud(data).flatten()
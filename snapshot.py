@@ -0,0 +1,114 @@
+"""
+Binary snapshot output for node fields at time slices
+
+Each field is saved as a memory-mapped .npy stack with the shape
+(frames, nrows, ncols) and a small json sidecar (snapshots.json) with the
+grid information and the time of each frame. This replaces the esri ascii
+output of each time slice, which is slow to write and large on disk.
+The frames of a model grid cropped to the watershed are saved on the terrain
+extent (0 outside the crop), like the esri ascii outputs.
+
+Usage:
+from snapshot import SnapshotWriter, read_snapshots
+writer = SnapshotWriter('output/snapshots', model_grid,
+                        ['surface_water__depth'], n_frames=20)
+writer.write(time_slice)
+writer.close()
+
+times, depth = read_snapshots('output/snapshots', 'surface_water__depth')
+
+"""
+
+import os
+import json
+
+import numpy as np
+
+
+class SnapshotWriter:
+    def __init__(self, folder, grid, fields, n_frames, start_frame=0,
+                 full_grid=None, crop=None):
+        """
+        folder: folder for the .npy stacks and the json sidecar
+        grid: RasterModelGrid of the model
+        fields: names of the node fields to save
+        n_frames: max number of frames of the stacks
+        start_frame: frame to continue writing in existing stacks
+        full_grid: grid of the terrain extent when the model grid is cropped
+        crop: (row slice, column slice) of the model grid on full_grid
+        """
+
+        self.folder = folder
+        self.grid = grid
+        self.crop = crop
+        # grid of the saved frames
+        self.extent_grid = grid if crop is None else full_grid
+        self.fields = list(fields)
+        self.n_frames = n_frames
+        self.times = []
+
+        os.makedirs(folder, exist_ok=True)
+
+        if start_frame > 0:
+            self.times = read_snapshot_info(folder)['times'][:start_frame]
+            mode = 'r+'
+        else:
+            mode = 'w+'
+
+        self.stacks = {}
+        for name in self.fields:
+            self.stacks[name] = np.lib.format.open_memmap(
+                os.path.join(folder, f'{name}.npy'),
+                mode=mode,
+                dtype=grid.at_node[name].dtype,
+                shape=(n_frames,) + tuple(self.extent_grid.shape))
+
+        self._write_info()
+
+    def write(self, time):
+        """save the fields at time (s) as a new frame"""
+        frame = len(self.times)
+        if frame >= self.n_frames:
+            raise IndexError('Number of snapshots exceeds n_frames')
+
+        for name, stack in self.stacks.items():
+            values = self.grid.at_node[name].reshape(self.grid.shape)
+            if self.crop is None:
+                stack[frame] = values
+            else:
+                stack[frame][self.crop] = values
+        self.times.append(float(time))
+
+        self._write_info()
+
+    def _write_info(self):
+        info = {
+            'fields': self.fields,
+            'times': self.times,
+            'shape': list(self.extent_grid.shape),
+            'xy_spacing': [self.extent_grid.dx, self.extent_grid.dy],
+            'xy_of_lower_left': list(self.extent_grid.xy_of_lower_left),
+            'row_order': 'bottom-up',
+        }
+
+        with open(os.path.join(self.folder, 'snapshots.json'), 'w') as fp:
+            json.dump(info, fp, indent=2)
+
+    def close(self):
+        for stack in self.stacks.values():
+            stack.flush()
+        self.stacks = {}
+
+
+def read_snapshot_info(folder):
+    """read the json sidecar of the snapshots"""
+    with open(os.path.join(folder, 'snapshots.json')) as fp:
+        return json.load(fp)
+
+
+def read_snapshots(folder, field, mmap_mode='r'):
+    """read the saved frames of a field as (times, 3D array)"""
+    times = read_snapshot_info(folder)['times']
+    stack = np.load(os.path.join(folder, f'{field}.npy'), mmap_mode=mmap_mode)
+
+    return np.array(times), stack[:len(times)]
@@ -0,0 +1,113 @@
+"""
+Binary cache of the model terrain
+
+Reading a large esri ascii DEM and finding the watershed boundary can take
+much longer than the model run setup. The cache saves the result (elevation,
+node status, outlet id and the crop of the terrain extent) as .npy files
+with a json file, so later runs with the same terrain file and settings load
+the grid from memory-mapped arrays.
+
+Each cache entry is a folder in the cache folder. Its name is a hash of the
+terrain file path, modification time, size, content hash and the terrain
+settings, so a changed file or setting creates a new entry.
+
+Usage:
+from terrain_cache import get_cache_entry, load_terrain, save_terrain
+entry = get_cache_entry('terrain_cache', 'geer_canyon.txt', terrain_settings)
+if os.path.isdir(entry):
+    model_grid, outlet_id, crop, full_grid = load_terrain(entry)
+
+"""
+
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+from landlab import RasterModelGrid
+
+
+def get_file_hash(file_path, chunk_size=1 << 20):
+    """get sha256 hash of the file content"""
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def get_cache_entry(cache_folder, grid_file, settings):
+    """get the cache entry folder for the terrain file and settings"""
+    stat = os.stat(grid_file)
+    key = json.dumps({
+        'path': os.path.abspath(grid_file),
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'hash': get_file_hash(grid_file),
+        'settings': settings,
+    }, sort_keys=True)
+
+    return os.path.join(cache_folder, hashlib.sha256(key.encode()).hexdigest())
+
+
+def _grid_info(grid):
+    return {
+        'shape': list(grid.shape),
+        'xy_spacing': [grid.dx, grid.dy],
+        'xy_of_lower_left': list(grid.xy_of_lower_left),
+    }
+
+
+def _create_grid(info):
+    return RasterModelGrid(tuple(info['shape']),
+                           xy_spacing=tuple(info['xy_spacing']),
+                           xy_of_lower_left=tuple(info['xy_of_lower_left']))
+
+
+def save_terrain(entry, model_grid, outlet_id, crop=None, full_grid=None):
+    """save the terrain of the model grid in the cache entry folder"""
+    info = {
+        'grid': _grid_info(model_grid),
+        'outlet_id': int(outlet_id),
+        'crop': None if crop is None else [
+            [int(crop[0].start), int(crop[0].stop)],
+            [int(crop[1].start), int(crop[1].stop)]],
+        'full_grid': None if full_grid is None else _grid_info(full_grid),
+    }
+
+    # write to a temporary folder first so that an entry is always complete
+    temp_entry = f'{entry}.tmp{os.getpid()}'
+    os.makedirs(temp_entry, exist_ok=True)
+    np.save(os.path.join(temp_entry, 'elevation.npy'),
+            model_grid.at_node['topographic__elevation'])
+    np.save(os.path.join(temp_entry, 'status_at_node.npy'), model_grid.status_at_node)
+    with open(os.path.join(temp_entry, 'terrain.json'), 'w') as fp:
+        json.dump(info, fp, indent=2)
+
+    try:
+        os.rename(temp_entry, entry)
+    except OSError:
+        # entry saved by another process
+        shutil.rmtree(temp_entry, ignore_errors=True)
+
+
+def load_terrain(entry):
+    """load the terrain as (model_grid, outlet_id, crop, full_grid)"""
+    with open(os.path.join(entry, 'terrain.json')) as fp:
+        info = json.load(fp)
+
+    model_grid = _create_grid(info['grid'])
+    model_grid.add_field('topographic__elevation',
+                         np.load(os.path.join(entry, 'elevation.npy'), mmap_mode='c'),
+                         at='node')
+    model_grid.status_at_node = np.load(os.path.join(entry, 'status_at_node.npy'))
+
+    crop = None
+    full_grid = None
+    if info['crop'] is not None:
+        crop = (slice(*info['crop'][0]), slice(*info['crop'][1]))
+        full_grid = _create_grid(info['full_grid'])
+
+    return model_grid, info['outlet_id'], crop, full_grid
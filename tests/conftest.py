@@ -0,0 +1,33 @@
+"""
+Tests of the Flood Simulator
+
+The tests run short model runs of the use cases of the repo.
+
+Usage (from the repo root):
+$ python -m pytest tests
+"""
+
+import os
+import sys
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_folder)
+
+
+def get_simple_config(output_folder, **model_run):
+    """configuration of the simple use case with plots off"""
+    with open(os.path.join(repo_folder, 'simple_use_case', 'config_file.toml'), 'rb') as fp:
+        config = tomllib.load(fp)
+
+    config['terrain']['grid_file'] = os.path.join(repo_folder, 'simple_use_case',
+                                                  'simple3.txt')
+    config['output'].update(output_folder=str(output_folder), plot_olf=False,
+                            plot_inf=False)
+    config['model_run'].update(model_run)
+
+    return config
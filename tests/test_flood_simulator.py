@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import get_simple_config
+from flood_simulator import FloodSimulator
+
+
+def get_hydrograph_volume(output_folder):
+    """volume (m3) of outlet_discharge.csv, discharge * time since the previous record"""
+    hydrograph = pd.read_csv(os.path.join(output_folder, 'outlet_discharge.csv'), index_col=0)
+    time = hydrograph['time'].to_numpy()
+
+    return (hydrograph['discharge'].to_numpy() * np.diff(time, prepend=0)).sum()
+
+
+def test_hold_hydrograph_matches_budget(tmp_path):
+    # a short storm, the recession reaches a steady state that is held
+    config = get_simple_config(tmp_path, model_run_time=40, storm_duration=5,
+                               time_step=1, steady_tolerance=1e-3)
+    fs = FloodSimulator(**config)
+    fs.run()
+
+    assert fs.run_summary['hold_reason'] == 'steady'
+    assert fs.run_summary['hold_time'] < fs.run_summary['end_time']
+
+    budget = pd.read_csv(os.path.join(tmp_path, 'mass_balance.csv'))
+    assert get_hydrograph_volume(tmp_path) == pytest.approx(budget['outflow'].iloc[-1],
+                                                            rel=1e-9)
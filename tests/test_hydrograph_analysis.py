@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import get_simple_config
+from flood_simulator import FloodSimulator
+from hydrograph_analysis import analyze_run, find_hydrograph_file
+
+
+@pytest.fixture
+def run_folder(tmp_path):
+    """output folder of a short run with the hydrograph streamed to outlet_discharge.bin"""
+    config = get_simple_config(tmp_path, model_run_time=10, storm_duration=5, time_step=1)
+    config['output']['hydrograph_buffer'] = 16
+    FloodSimulator(**config).run()
+
+    return str(tmp_path)
+
+
+def test_find_hydrograph_file_prefers_complete_bin(run_folder):
+    # the csv is written after the .bin, the streamed file is still chosen
+    assert find_hydrograph_file(run_folder) == os.path.join(run_folder,
+                                                            'outlet_discharge.json')
+
+    summary, _ = analyze_run(run_folder)
+    hydrograph = pd.read_csv(os.path.join(run_folder, 'outlet_discharge.csv'), index_col=0)
+    assert summary['records'].iloc[0] == len(hydrograph)
+    assert summary['peak_discharge'].iloc[0] == pytest.approx(hydrograph['discharge'].max())
+
+
+def test_find_hydrograph_file_skips_incomplete_bin(run_folder):
+    # a .bin cut short (e.g. an interrupted run) is not read
+    bin_file = os.path.join(run_folder, 'outlet_discharge.bin')
+    os.truncate(bin_file, os.path.getsize(bin_file) - 8 * 2)
+    assert find_hydrograph_file(run_folder) == os.path.join(run_folder,
+                                                            'outlet_discharge.csv')
+
+
+def test_run_without_streaming_removes_stale_bin(run_folder):
+    config = get_simple_config(run_folder, model_run_time=5, storm_duration=5, time_step=1)
+    fs = FloodSimulator(**config)
+    fs.run()
+
+    assert not os.path.isfile(os.path.join(run_folder, 'outlet_discharge.bin'))
+    assert find_hydrograph_file(run_folder) == os.path.join(run_folder,
+                                                            'outlet_discharge.csv')
+    summary, _ = analyze_run(run_folder)
+    assert summary['end_time'].iloc[0] == pytest.approx(fs.run_summary['end_time'])
@@ -0,0 +1,190 @@
+"""
+Control of the model sub-step and the end of the overland flow run
+
+TimeStepController limits the adaptive time step of OverlandFlow with a max
+step (independent of the reporting time step) and flags a stalled run when
+the step stays below a min step, so the run stops and its outputs are saved
+up to the stall. After the storm, it detects a
+dry domain (max water depth below dry_depth) or a steady state (max change of
+water depth in a reporting time step below steady_tolerance). Then the model
+state is held to the end of the run instead of solving the recession tail,
+with the water at rest (no discharge at the outlet and in the flood metrics).
+
+StopCondition ends the run early after the storm when the watershed drains:
+the stored water volume is below stop_volume, or the outlet discharge falls
+below stop_discharge (after it was above) for a number of consecutive
+reporting time steps.
+
+Usage:
+from time_stepping import StopCondition, TimeStepController
+time_stepper = TimeStepController(max_dt=120, min_dt=1e-3, storm_duration=600,
+                                  dry_depth=1e-4)
+overland_flow.dt = time_stepper.get_dt(overland_flow.calc_time_step(), elapsed_time)
+if time_stepper.stalled: ...
+time_stepper.update(time_slice, model_grid.at_node['surface_water__depth'])
+if time_stepper.hold: ...
+
+stop_condition = StopCondition(storm_duration=600, stop_volume=10)
+if stop_condition.update(time_slice, volume, outlet_discharge): ...
+
+"""
+
+import warnings
+
+import numpy as np
+
+
+class TimeStepController:
+    def __init__(self,
+                 max_dt,
+                 min_dt=0.0,
+                 stall_steps=100,
+                 storm_duration=0.0,
+                 dry_depth=0.0,
+                 steady_tolerance=0.0):
+        """
+        max_dt: max sub-step (s)
+        min_dt: min sub-step (s), 0 to disable the stall guard
+        stall_steps: number of steps below min_dt to stop the run (stalled)
+        storm_duration: duration (s) of rain, the model state is not held
+                        before the end of the storm
+        dry_depth: max water depth (m) of a dry domain, 0 to disable
+        steady_tolerance: max change of water depth (m) in a reporting time
+                          step of a steady state, 0 to disable
+        """
+        self.max_dt = max_dt
+        self.min_dt = min_dt
+        self.stall_steps = stall_steps
+        self.storm_duration = storm_duration
+        self.dry_depth = dry_depth
+        self.steady_tolerance = steady_tolerance
+
+        self.hold = False  # the model state is held
+        self.hold_reason = ''
+        self.hold_time = np.nan
+        self.stalled_steps = 0
+        self.stalled = False  # the run stalled and stops
+        self.stall_time = np.nan
+        self.last_depth = None
+
+    def get_dt(self, calc_dt, elapsed_time):
+        """get the sub-step (s) from the stable time step of the model"""
+        if calc_dt < self.min_dt:
+            self.stalled_steps += 1
+            if self.stalled_steps >= self.stall_steps and not self.stalled:
+                self.stalled = True
+                self.stall_time = elapsed_time
+                warnings.warn(
+                    f'Model run stalled at {elapsed_time:.1f} s: the time step '
+                    f'({calc_dt:.3g} s) was below min_dt ({self.min_dt} s) for '
+                    f'{self.stalled_steps} steps. The run stops.')
+        else:
+            self.stalled_steps = 0
+
+        return min(calc_dt, self.max_dt)
+
+    def update(self, model_time, depth):
+        """check if the model state can be held at the end of a reporting time step"""
+        if self.hold:
+            return
+
+        if self.steady_tolerance > 0:
+            last_depth = self.last_depth
+            self.last_depth = depth.copy()
+        if model_time < self.storm_duration:
+            return
+
+        if self.dry_depth > 0 and depth.max() < self.dry_depth:
+            self.hold_reason = 'dry'
+        elif self.steady_tolerance > 0 and last_depth is not None and \
+                np.abs(depth - last_depth).max() < self.steady_tolerance:
+            self.hold_reason = 'steady'
+        else:
+            return
+
+        self.hold = True
+        self.hold_time = model_time
+        self.last_depth = None
+
+    def get_state(self):
+        state = {
+            'hold': np.array(self.hold),
+            'hold_reason': np.array(self.hold_reason),
+            'hold_time': np.array(self.hold_time),
+            'stalled_steps': np.array(self.stalled_steps),
+        }
+        if self.last_depth is not None:
+            state['last_depth'] = self.last_depth
+
+        return state
+
+    def set_state(self, state):
+        self.hold = bool(state['hold'])
+        self.hold_reason = str(state['hold_reason'])
+        self.hold_time = float(state['hold_time'])
+        self.stalled_steps = int(state['stalled_steps'])
+        self.last_depth = state.get('last_depth')
+
+
+class StopCondition:
+    def __init__(self,
+                 storm_duration=0.0,
+                 stop_volume=0.0,
+                 stop_discharge=0.0,
+                 stop_intervals=1):
+        """
+        storm_duration: duration (s) of rain, the run does not stop before
+                        the end of the storm
+        stop_volume: stored water volume (m3) to stop the run, 0 to disable
+        stop_discharge: outlet discharge (cms) to stop the run, 0 to disable
+        stop_intervals: number of consecutive reporting time steps with the
+                        outlet discharge below stop_discharge to stop the run.
+                        Only counted after the discharge was above
+                        stop_discharge, so the run does not stop before the
+                        flood reaches the outlet.
+        """
+        self.storm_duration = storm_duration
+        self.stop_volume = stop_volume
+        self.stop_discharge = stop_discharge
+        self.stop_intervals = stop_intervals
+
+        self.max_discharge = 0.0
+        self.low_discharge_intervals = 0
+        self.stop_reason = ''
+        self.stop_time = np.nan
+
+    @property
+    def enabled(self):
+        return self.stop_volume > 0 or self.stop_discharge > 0
+
+    def update(self, model_time, volume, outlet_discharge):
+        """check the stop condition at the end of a reporting time step"""
+        self.max_discharge = max(self.max_discharge, outlet_discharge)
+        if self.stop_discharge > 0 and model_time >= self.storm_duration and \
+                self.max_discharge >= self.stop_discharge:
+            if outlet_discharge < self.stop_discharge:
+                self.low_discharge_intervals += 1
+            else:
+                self.low_discharge_intervals = 0
+
+        if model_time < self.storm_duration:
+            return False
+
+        if self.stop_volume > 0 and volume < self.stop_volume:
+            self.stop_reason = 'volume'
+        elif self.stop_discharge > 0 and \
+                self.low_discharge_intervals >= self.stop_intervals:
+            self.stop_reason = 'discharge'
+        else:
+            return False
+
+        self.stop_time = model_time
+        return True
+
+    def get_state(self):
+        return {'max_discharge': np.array(self.max_discharge),
+                'low_discharge_intervals': np.array(self.low_discharge_intervals)}
+
+    def set_state(self, state):
+        self.max_discharge = float(state['max_discharge'])
+        self.low_discharge_intervals = int(state['low_discharge_intervals'])